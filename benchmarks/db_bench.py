@@ -0,0 +1,130 @@
+"""Micro-benchmarks for NewsDatabase methods and the publisher stages.
+
+Run against a database from benchmarks.gen_db (or a real one). Anything that
+writes runs on a scratch copy, so the source database is left alone.
+Results are printed as JSON, tagged with the current git commit, for comparing runs.
+
+    python -m benchmarks.db_bench big.db --out before.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+from database import NewsDatabase
+import news_publisher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def timeit(fn: Callable[[], Any], repeat: int):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+def copy_db(src: str, dest: str):
+    with sqlite3.connect(src) as s, sqlite3.connect(dest) as d:
+        s.backup(d)
+
+class Bench:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results: list[dict[str, Any]] = []
+
+    def run(self, name: str, fn: Callable[[], Any], repeat: int | None = None, per: int | None = None):
+        times, result = timeit(fn, repeat or self.repeat)
+        entry: dict[str, Any] = {
+            'name': name,
+            'runs': len(times),
+            'min_seconds': round(min(times), 6),
+            'median_seconds': round(statistics.median(times), 6),
+        }
+        if per:
+            entry['per_call_us'] = round(min(times) / per * 1e6, 3)
+        self.results.append(entry)
+        print(json.dumps(entry), file=sys.stderr)
+        return result
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('db_path')
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--sample', type=int, default=2000, help='gids/appids sampled for per-item lookups')
+    p.add_argument('--render-limit', type=int, default=None, help='only render this many window items in the publisher stages')
+    p.add_argument('--out', help='write results JSON here as well as stdout')
+    a = p.parse_args()
+
+    rng = random.Random(0)
+    bench = Bench(a.repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with NewsDatabase(a.db_path) as db:
+            assert db.db is not None
+            item_count = db.db.execute('SELECT count(*) FROM NewsItems').fetchone()[0]
+            game_count = db.db.execute('SELECT count(*) FROM Games').fetchone()[0]
+
+            rows = bench.run('get_news_rows', lambda: list(db.get_news_rows()))
+            gids = [row.gid for row in rng.sample(rows, min(a.sample, len(rows)))]
+            appids = list(db.get_fetch_games())
+            sample_appids = rng.sample(appids, min(a.sample, len(appids)))
+
+            bench.run('get_source_names_and_appids_for_item', lambda: [db.get_source_names_and_appids_for_item(g) for g in gids], per=len(gids))
+            bench.run('get_fetch_games', db.get_fetch_games)
+            bench.run('is_news_cached', lambda: [db.is_news_cached(x) for x in sample_appids], per=len(sample_appids))
+            bench.run('get_cached_appids', db.get_cached_appids)
+            bench.run('get_high_water_marks', db.get_high_water_marks)
+            bench.run('get_recent_gids', db.get_recent_gids)
+            bench.run('get_clan_ids', lambda: db.get_clan_ids(appids))
+            bench.run('get_games_like', lambda: db.get_games_like('Game 1'))
+
+            render_rows = rows[:a.render_limit] if a.render_limit else rows
+            rssitems = bench.run('publish.render_items', lambda: [news_publisher.news_item_to_rss_item(r, db) for r in render_rows], repeat=1, per=len(render_rows))
+            feed = bench.run('publish.gen_rss_feed', lambda: news_publisher.gen_rss_feed(rssitems), repeat=1)
+            bench.run('publish.to_xml', lambda: feed.to_xml(encoding='utf-8'), repeat=1)
+            if not a.render_limit:
+                bench.run('publish.total', lambda: news_publisher.publish(db, os.path.join(tmp, 'steam_news.xml')), repeat=1)
+                bench.run('publish.total_all_formats', lambda: news_publisher.publish(db, os.path.join(tmp, 'steam_news.xml'), formats=news_publisher.FEED_FORMATS), repeat=1)
+
+        #writes go to a scratch copy
+        scratch = os.path.join(tmp, 'scratch.db')
+        copy_db(a.db_path, scratch)
+        with NewsDatabase(scratch) as db:
+            new_items = [row._replace(gid=f'bench{i}') for i, row in enumerate(rows[:a.sample])]
+            bench.run('save_fetched_news (1 per app)', lambda: [db.save_fetched_news(x.appid, 0, [(x, ())], ()) for x in new_items], repeat=1, per=len(new_items))
+            #items already stored, seen again under another app: only linked
+            bench.run('save_fetched_news (link only)', lambda: [db.save_fetched_news(x.appid, 0, [], [x.gid]) for x in new_items], repeat=1, per=len(new_items))
+            batched = [row._replace(gid=f'batch{i}') for i, row in enumerate(rows[:a.sample])]
+            bench.run('save_fetched_news (10 per app)', lambda: [db.save_fetched_news(x[0].appid, 0, [(r, ()) for r in x], ()) for x in (batched[i:i + 10] for i in range(0, len(batched), 10))], repeat=1, per=len(batched))
+            bench.run('update_expire_time', lambda: [db.update_expire_time(x, int(time.time())) for x in sample_appids], repeat=1, per=len(sample_appids))
+            bench.run('prune_old_news(30)', lambda: db.prune_old_news(30), repeat=1)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': int(time.time()),
+        'db': {'path': a.db_path, 'size_bytes': os.path.getsize(a.db_path), 'items': item_count, 'games': game_count, 'window_items': len(rows)},
+        'results': bench.results,
+    }
+    if a.out:
+        with open(a.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
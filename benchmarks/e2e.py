@@ -0,0 +1,110 @@
+"""End-to-end benchmarks: drive steam_news.main against a local fake Steam API.
+
+Each scenario runs in its own child process so wall time and peak RSS are per scenario.
+Scenarios share a database per library size, in order: seed, fetch, publish.
+
+    python -m benchmarks.e2e --games 100 1000 10000 --out bench.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_steam_server import FAKE_STEAMID, FakeSteamConfig, FakeSteamServer
+
+SCENARIOS = ('seed', 'fetch', 'publish')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def scenario_args(scenario: str, db_path: str, out_dir: str) -> list[str]:
+    if scenario == 'seed':
+        return ['--db-path', db_path, '--first-run', '--add-profile-games', FAKE_STEAMID]
+    if scenario == 'fetch':
+        return ['--db-path', db_path, '--fetch']
+    if scenario == 'publish':
+        return ['--db-path', db_path, '--publish', os.path.join(out_dir, 'steam_news.xml')]
+    raise ValueError(f'Unknown scenario {scenario}')
+
+def run_child(server_url: str, args: list[str]):
+    """Runs in the child process: point steam_news at the fake server and run main()."""
+    os.environ.setdefault('STEAM_WEB_API_KEY', 'benchmark')
+    from yarl import URL
+    import typed_argparse as tap
+    import steam_news
+    from steam_unofficial_api import URLs
+
+    steam_news.STEAM_API_URL = server_url
+    steam_news.FETCH_DELAY = 0
+    steam_news.FETCH_ERROR_DELAY = 0
+    URLs.API = URLs.STORE = URLs.COMMUNITY = URL(server_url)
+
+    tap.Parser(steam_news.Args).bind(steam_news.main).run(args)
+
+def run_scenario(server: FakeSteamServer, scenario: str, db_path: str, out_dir: str, verbose: bool):
+    requests_before = server.requests
+    bytes_before = server.bytes_sent
+    cmd = [sys.executable, '-m', 'benchmarks.e2e', '--child', server.url, '--', *scenario_args(scenario, db_path, out_dir)]
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=None if verbose else subprocess.DEVNULL)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    requests = server.requests - requests_before
+    return {
+        'scenario': scenario,
+        'games': server.config.games,
+        'ok': proc.returncode == 0,
+        'wall_seconds': round(wall, 4),
+        'requests': requests,
+        'requests_per_second': round(requests / wall, 2) if wall else None,
+        'bytes_received': server.bytes_sent - bytes_before,
+        #ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(rusage.ru_maxrss / 1024, 1),
+    }
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--games', type=int, nargs='+', default=[100, 1000, 10000])
+    p.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    p.add_argument('--latency', type=float, default=0.0, help='seconds of latency per request')
+    p.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail with a 500')
+    p.add_argument('--expires', type=int, default=3600, help='seconds until the Expires header on news responses')
+    p.add_argument('--body-size', type=int, default=2000, help='characters per news body')
+    p.add_argument('--out', help='write results JSON here as well as stdout')
+    p.add_argument('-v', '--verbose', action='store_true', help='show the runs\' own logging')
+    p.add_argument('--child', metavar='SERVER_URL', help=argparse.SUPPRESS)
+    p.add_argument('child_args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    a = p.parse_args()
+
+    if a.child:
+        run_child(a.child, [x for x in a.child_args if x != '--'])
+        return
+
+    results = []
+    for games in a.games:
+        config = FakeSteamConfig(games=games, latency=a.latency, error_rate=a.error_rate, expires=a.expires, body_size=a.body_size)
+        with FakeSteamServer(config) as server, tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'SteamNews.db')
+            for scenario in a.scenarios:
+                result = run_scenario(server, scenario, db_path, tmp, a.verbose)
+                print(json.dumps(result), file=sys.stderr)
+                results.append(result)
+
+    report = {
+        'timestamp': int(time.time()),
+        'config': {k: v for k, v in vars(a).items() if k not in ('child', 'child_args', 'out', 'verbose')},
+        'results': results,
+    }
+    if a.out:
+        with open(a.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
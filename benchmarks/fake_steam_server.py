@@ -0,0 +1,236 @@
+"""A local stand-in for the Steam endpoints we use, for benchmarking without hitting Steam.
+
+Serves GetOwnedGames, GetAppList, GetNewsForApp and the store events/clan endpoints
+with deterministic, generated data. Latency, error rate, Expires headers and
+news body sizes are all configurable."""
+
+from dataclasses import dataclass
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+FAKE_STEAMID = '76561197960287930'
+
+@dataclass
+class FakeSteamConfig:
+    games: int = 100
+    #seconds added to every response
+    latency: float = 0.0
+    #fraction of requests answered with a 500
+    error_rate: float = 0.0
+    #seconds from now for the Expires header on GetNewsForApp
+    expires: int = 3600
+    #news items each app has, one every `news_interval` seconds back from now
+    news_per_app: int = 15
+    news_interval: int = 6 * 60 * 60
+    #size of each generated news body, in characters
+    body_size: int = 2000
+    #every app also carries the newest post of one of this many "publishers", so gids are shared across apps
+    publishers: int = 50
+    seed: int = 0
+
+FIRST_APPID = 10
+
+BBCODE_CHUNK = '[h2]Patch notes[/h2]\n[list]\n[*]Fixed a [b]bug[/b] with [url=https://example.com]links[/url]\n[*][i]Improved[/i] performance\n[/list]\n[img]{STEAM_CLAN_IMAGE}/123/abc.png[/img]\n'
+HTML_CHUNK = '<p>Some <b>news</b> about the <a href="https://example.com">game</a>.</p>\n'
+
+def make_body(size: int, bbcode: bool):
+    chunk = BBCODE_CHUNK if bbcode else HTML_CHUNK
+    return (chunk * (size // len(chunk) + 1))[:size]
+
+class FakeSteamServer:
+    def __init__(self, config: FakeSteamConfig, host: str = '127.0.0.1', port: int = 0):
+        self.config = config
+        self.now = int(time.time())
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(config.seed)
+        self._bodies = {True: make_body(config.body_size, True), False: make_body(config.body_size, False)}
+
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def appids(self):
+        return range(FIRST_APPID, FIRST_APPID + self.config.games)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-steam', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    # Request handling
+
+    def handle(self, req: BaseHTTPRequestHandler):
+        url = urlparse(req.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path.rstrip('/')
+
+        if self.config.latency:
+            time.sleep(self.config.latency)
+
+        with self._lock:
+            self.requests += 1
+            fail = self.config.error_rate and self._rng.random() < self.config.error_rate
+
+        headers: dict[str, str] = {}
+        if fail:
+            status, body = 500, {'error': 'fake failure'}
+        elif path.endswith('/GetOwnedGames/v0001'):
+            status, body = 200, self.owned_games()
+        elif path.endswith('/GetAppList/v2'):
+            status, body = 200, self.app_list()
+        elif path.endswith('/GetNewsForApp/v0002'):
+            status, body = 200, self.news_for_app(int(query['appid']), int(query.get('count', 20)), int(query.get('enddate', 0)) or None)
+            headers['Expires'] = formatdate(time.time() + self.config.expires, usegmt=True)
+        elif path.endswith('/ajaxgetvanityandclanid'):
+            status, body = 200, self.vanity_and_clan_id(int(path.split('/')[-2]))
+        elif path.endswith('/events/ajaxgetusereventcalendarrange'):
+            status, body = 200, self.event_calendar_range(int(query.get('maxTime', 0)) or self.now, int(query.get('maxResults', 500)))
+        elif path.endswith('/events/ajaxgeteventdetails'):
+            status, body = 200, self.event_details(query.get('clanid_list', ''), query.get('uniqueid_list', ''))
+        else:
+            status, body = 404, {'error': 'not found'}
+
+        payload = json.dumps(body).encode()
+        req.send_response(status)
+        req.send_header('Content-Type', 'application/json')
+        req.send_header('Content-Length', str(len(payload)))
+        for k, v in headers.items():
+            req.send_header(k, v)
+        req.end_headers()
+        req.wfile.write(payload)
+        with self._lock:
+            self.bytes_sent += len(payload)
+
+    # Generated data
+
+    def owned_games(self):
+        games = [
+            {
+                'appid': appid,
+                'playtime_forever': (appid * 37) % 5000,
+                'playtime_windows_forever': 0,
+                'playtime_mac_forever': 0,
+                'playtime_linux_forever': 0,
+                'playtime_deck_forever': 0,
+                'rtime_last_played': self.now - (appid * 7919) % (365 * 24 * 60 * 60),
+                'playtime_disconnected': 0,
+            } for appid in self.appids
+        ]
+        return {'response': {'game_count': len(games), 'games': games}}
+
+    def app_list(self):
+        return {'applist': {'apps': [{'appid': appid, 'name': f'Game {appid}'} for appid in self.appids]}}
+
+    def news_items(self, appid: int):
+        c = self.config
+        publisher = appid % c.publishers if c.publishers else None
+        items = []
+        for i in range(c.news_per_app):
+            if i == 0 and publisher is not None:
+                gid, date, bbcode = f'9{publisher:08}', self.now - 60, True
+            else:
+                gid, date, bbcode = f'{appid}{i:04}', self.now - i * c.news_interval - appid % 60, appid % 2 == 0
+            items.append({
+                'gid': gid,
+                'title': f'News {i} for Game {appid}',
+                'url': f'https://store.steampowered.com/news/app/{appid}/view/{gid}',
+                'is_external_url': False,
+                'author': 'fake',
+                'contents': self._bodies[bbcode],
+                'feedlabel': 'Community Announcements' if bbcode else 'Fake News Site',
+                'date': date,
+                'feedname': 'steam_community_announcements' if bbcode else 'fake_news_site',
+                'feed_type': 1 if bbcode else 0,
+                'appid': appid,
+                'tags': ['patchnotes'] if i % 3 == 0 else [],
+            })
+        return items
+
+    def news_for_app(self, appid: int, count: int, enddate: int | None):
+        items = [x for x in self.news_items(appid) if enddate is None or x['date'] <= enddate]
+        return {'appnews': {'appid': appid, 'newsitems': items[:count], 'count': len(items)}}
+
+    def vanity_and_clan_id(self, appid: int):
+        if appid % 10 == 0:
+            return {'success': 2}
+        return {
+            'success': 1, 'appid': appid, 'clanAccountID': appid * 10, 'clanSteamIDString': str(appid * 10),
+            'member_count': 0, 'vanity_url': f'game{appid}', 'is_ogg': True, 'is_creator_home': 0, 'is_curator': False,
+            'has_visible_store_page': True, 'avatar_full_url': '', 'group_name': f'Game {appid}',
+        }
+
+    def event(self, clanid: int, gid: str, start: int):
+        return {
+            'gid': gid, 'clan_steamid': str(clanid), 'event_name': f'Event {gid}', 'event_type': 12,
+            'appid': clanid // 10, 'rtime32_start_time': start, 'announcement_body': {
+                'gid': gid, 'clanid': str(clanid), 'headline': f'Event {gid}', 'posttime': start,
+                'body': self._bodies[True], 'tags': [],
+            },
+        }
+
+    def event_calendar_range(self, max_time: int, max_results: int):
+        interval = max(self.config.news_interval // max(self.config.games, 1), 1)
+        oldest = self.now - self.config.news_per_app * self.config.news_interval
+        starts = [t for t in range(max_time - max_time % interval, oldest, -interval)][:max_results]
+        documents = [
+            {'clanid': (FIRST_APPID + t % self.config.games) * 10, 'unique_id': str(t), 'event_type': 12,
+             'appid': FIRST_APPID + t % self.config.games, 'start_time': t, 'score': 0}
+                for t in starts
+        ]
+        return {
+            'success': 1, 'backwardComplete': len(starts) < max_results, 'forwardComplete': None,
+            'documents': documents, 'apps': [], 'clans': [], 'events': [],
+            'metadatainfo': {}, 'event_votes': [], 'events_read': [],
+        }
+
+    def event_details(self, clanids: str, uniqueids: str):
+        pairs = zip(clanids.split(','), uniqueids.split(',')) if clanids else []
+        return {'success': 1, 'events': [self.event(int(c), u, int(u)) for c, u in pairs]}
+
+if __name__ == '__main__':
+    import argparse
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--games', type=int, default=100)
+    p.add_argument('--latency', type=float, default=0.0)
+    p.add_argument('--error-rate', type=float, default=0.0)
+    p.add_argument('--expires', type=int, default=3600)
+    p.add_argument('--body-size', type=int, default=2000)
+    a = p.parse_args()
+    server = FakeSteamServer(FakeSteamConfig(games=a.games, latency=a.latency, error_rate=a.error_rate, expires=a.expires, body_size=a.body_size), port=a.port)
+    print(f'Serving fake Steam API on {server.url}')
+    server.httpd.serve_forever()
@@ -0,0 +1,122 @@
+"""Generate a large synthetic SteamNews.db for scaling benchmarks.
+
+Items are spread evenly over `--days` days, so roughly items * 30 / days of them
+fall inside the 30 day publishing window. A fraction of gids are "publisher"
+posts linked to several apps, the way Steam-wide announcements are.
+
+    python -m benchmarks.gen_db big.db --items 1000000 --games 50000
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+from database import NewsDatabase
+
+BBCODE_PARTS = [
+    '[h2]Patch {n}[/h2]\n',
+    '[list]\n[*]Fixed [b]{n}[/b] crashes\n[*][i]Tweaked[/i] balance\n[*]See [url=https://example.com/{n}]the forums[/url]\n[/list]\n',
+    '[img]{{STEAM_CLAN_IMAGE}}/{n}/abcdef0123456789.png[/img]\n',
+    '[previewyoutube=dQw4w9WgXcQ;full][/previewyoutube]\n',
+    '[quote=dev]Thanks for playing![/quote]\n',
+    '[table][tr][th]Item[/th][th]Price[/th][/tr][tr][td]DLC {n}[/td][td]$4.99[/td][/tr][/table]\n',
+    'Plain text paragraph number {n} with some words in it.\n',
+]
+
+HTML_PARTS = [
+    '<p>News paragraph {n} with <b>bold</b> and <a href="https://example.com/{n}">a link</a>.</p>\n',
+    '<img src="https://example.com/{n}.jpg">\n',
+    '<ul><li>Point {n}</li><li>Another point</li></ul>\n',
+]
+
+def make_body(rng: random.Random, bbcode: bool, size: int):
+    parts = BBCODE_PARTS if bbcode else HTML_PARTS
+    out: list[str] = []
+    length = 0
+    while length < size:
+        part = rng.choice(parts).format(n=rng.randint(1, 99999))
+        out.append(part)
+        length += len(part)
+    return ''.join(out)
+
+def generate(path: str, items: int, games: int, days: int = 365, shared_fraction: float = 0.02,
+        max_shared_sources: int = 20, body_size: int = 1500, seed: int = 0, batch: int = 20000):
+    if os.path.exists(path):
+        raise FileExistsError(path)
+
+    rng = random.Random(seed)
+    now = int(time.time())
+    span = days * 24 * 60 * 60
+    first_appid = 10
+
+    #a few pregenerated bodies per kind, varied in length, keeps generation fast without every row being identical
+    bodies = {
+        kind: [make_body(rng, kind, int(body_size * rng.uniform(0.2, 2.0))) for _ in range(64)]
+            for kind in (True, False)
+    }
+
+    with NewsDatabase(path) as db:
+        db.first_run()
+        conn = db.db
+        assert conn is not None
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA journal_mode = MEMORY')
+
+        appids = list(range(first_appid, first_appid + games))
+        with conn:
+            conn.executemany('INSERT INTO Games VALUES (?, ?, ?)',
+                ((appid, f'Game {appid}', 1 if rng.random() < 0.8 else 0) for appid in appids))
+            conn.executemany('INSERT INTO ExpireTimes VALUES (?, ?)',
+                ((appid, now + rng.randint(-3600, 3600)) for appid in appids))
+
+        done = 0
+        while done < items:
+            n = min(batch, items - done)
+            news_rows = []
+            source_rows = []
+            for i in range(done, done + n):
+                appid = rng.choice(appids)
+                bbcode = rng.random() < 0.6
+                gid = str(5000000000000000000 + i)
+                news_rows.append((
+                    gid,
+                    f'Update {i} for Game {appid}',
+                    f'https://store.steampowered.com/news/app/{appid}/view/{gid}',
+                    0,
+                    'dev',
+                    rng.choice(bodies[bbcode]),
+                    'Community Announcements' if bbcode else 'Some News Site',
+                    now - int(span * i / items) - rng.randint(0, 600),
+                    'steam_community_announcements' if bbcode else 'some_news_site',
+                    1 if bbcode else 0,
+                    appid,
+                ))
+                source_rows.append((gid, appid))
+                if rng.random() < shared_fraction:
+                    for other in rng.sample(appids, min(rng.randint(2, max_shared_sources), len(appids))):
+                        if other != appid:
+                            source_rows.append((gid, other))
+            with conn:
+                conn.executemany('INSERT INTO NewsItems VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', news_rows)
+                conn.executemany('INSERT OR IGNORE INTO NewsSources VALUES (?, ?)', source_rows)
+            done += n
+            logging.info('%d/%d items', done, items)
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('path')
+    p.add_argument('--items', type=int, default=1_000_000)
+    p.add_argument('--games', type=int, default=50_000)
+    p.add_argument('--days', type=int, default=365, help='spread items over this many days')
+    p.add_argument('--shared-fraction', type=float, default=0.02, help='fraction of items linked to several apps')
+    p.add_argument('--body-size', type=int, default=1500, help='typical body length in characters')
+    p.add_argument('--seed', type=int, default=0)
+    a = p.parse_args()
+    logging.basicConfig(stream=sys.stdout, format='%(asctime)s | %(name)s | %(levelname)s | %(message)s', level=logging.INFO)
+    generate(a.path, a.items, a.games, a.days, a.shared_fraction, body_size=a.body_size, seed=a.seed)
+
+if __name__ == '__main__':
+    main()
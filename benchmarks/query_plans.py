@@ -0,0 +1,127 @@
+"""Query plan checks for the schema migrations in database.MIGRATIONS.
+
+Runs the NewsDatabase methods on the hot paths, captures the SQL they send,
+and checks EXPLAIN QUERY PLAN uses the index each migration added for it.
+Also checks a DB from before user_version was tracked upgrades in place to
+the same schema as a new one. Exits non-zero if anything doesn't match.
+
+    python -m benchmarks.query_plans
+    python -m benchmarks.query_plans --db-path big.db
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Any, Callable, NamedTuple
+
+from database import MIGRATIONS, NewsDatabase
+from steam_news_types import NewsRow
+
+class PlanCheck(NamedTuple):
+    migration: int # the migration that added (or relies on) the index
+    name: str
+    call: Callable[[NewsDatabase], Any]
+    expect: str # substring of the plan, e.g. 'COVERING INDEX NewsDateGidIdx'
+
+CHECKS = [
+    PlanCheck(1, 'get_source_names_and_appids_for_item: NewsSources by gid', lambda db: db.get_source_names_and_appids_for_item('1'),
+        'COVERING INDEX sqlite_autoindex_NewsSources_1 (gid=?)'),
+    PlanCheck(2, 'begin_fetch_run: resumed run\'s journal', lambda db: (db.begin_fetch_run(), db.begin_fetch_run()), 'sqlite_autoindex_FetchRunApps_1 (runid=?)'),
+    PlanCheck(3, 'get_news_rows: 30 day window, newest first', lambda db: list(db.get_news_rows()), 'INDEX NewsDateGidIdx (date>?)'),
+    PlanCheck(3, 'get_recent_gids: gids from the index alone', lambda db: db.get_recent_gids(), 'COVERING INDEX NewsDateGidIdx (date>?)'),
+    PlanCheck(3, 'get_high_water_marks: window joined to NewsSources', lambda db: db.get_high_water_marks(), 'COVERING INDEX NewsDateGidIdx (date>?)'),
+    PlanCheck(3, 'get_high_water_marks: NewsSources by gid', lambda db: db.get_high_water_marks(), 'sqlite_autoindex_NewsSources_1 (gid=?)'),
+    PlanCheck(3, 'get_news_sources: window joined to NewsSources', lambda db: db.get_news_sources(), 'COVERING INDEX NewsDateGidIdx (date>?)'),
+    PlanCheck(3, 'get_news_tags: window joined to NewsTags', lambda db: db.get_news_tags(), 'COVERING INDEX NewsDateGidIdx (date>?)'),
+    PlanCheck(3, 'get_cached_appids: due list', lambda db: db.get_cached_appids(), 'COVERING INDEX ExpireTimesDueIdx (unixseconds>?)'),
+    PlanCheck(3, 'get_fetch_games: fetched games', lambda db: db.get_fetch_games(), 'INDEX GamesFetchIdx'),
+    PlanCheck(3, 'get_fetch_games: fetched user games', lambda db: db.get_fetch_games(), 'INDEX UserGamesFetchIdx'),
+]
+
+def traced_plans(db: NewsDatabase, call: Callable[[NewsDatabase], Any]):
+    """Run call, then return the query plan of every SELECT it ran (with the parameters inlined)"""
+    assert db.db is not None
+    statements: list[str] = []
+    db.db.set_trace_callback(statements.append)
+    try:
+        call(db)
+    finally:
+        db.db.set_trace_callback(None)
+    plans = []
+    for sql in statements:
+        if sql.lstrip().upper().startswith('SELECT'):
+            plans.append([detail for _, _, _, detail in db.db.execute('EXPLAIN QUERY PLAN ' + sql)])
+    return plans
+
+def seed(db: NewsDatabase):
+    """A little data, so the planner has something to go on. Most games aren't fetched, as with a real library."""
+    assert db.db is not None
+    now = int(time.time())
+    with db.db as conn:
+        conn.executemany('INSERT INTO Games VALUES (?, ?, ?)', ((i, f'Game {i}', 1 if i % 10 == 0 else 0) for i in range(1, 501)))
+        conn.execute("INSERT INTO Users VALUES ('bench', NULL)")
+        conn.executemany("INSERT INTO UserGames VALUES ('bench', ?, ?)", ((i, 1 if i % 20 == 0 else 0) for i in range(1, 501)))
+        conn.executemany('INSERT INTO ExpireTimes VALUES (?, ?)', ((i, now + (3600 if i % 3 else -3600)) for i in range(1, 501)))
+    rows = [NewsRow(str(i), f'Item {i}', None, 0, None, '', None, now - i * 3600, 'feed', 0, i % 500 + 1) for i in range(2000)]
+    db.save_fetched_news(1, now, [(row, ('patchnotes',)) for row in rows], ())
+    db.db.execute('ANALYZE')
+
+def schema(conn: sqlite3.Connection):
+    return sorted(conn.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'").fetchall())
+
+def check_upgrade(tmp: str):
+    """A DB from before user_version (first_run() plus the tables open() used to add) should end up like a new one"""
+    old_path = os.path.join(tmp, 'old.db')
+    with sqlite3.connect(old_path) as conn:
+        for migration in MIGRATIONS[:2]:
+            for sql in migration:
+                conn.execute(sql)
+        conn.execute("INSERT INTO Games VALUES (10, 'Old game', 1)")
+    new_path = os.path.join(tmp, 'new.db')
+    with NewsDatabase(old_path), NewsDatabase(new_path):
+        pass
+    with sqlite3.connect(old_path) as old, sqlite3.connect(new_path) as new:
+        problems = []
+        if (v := old.execute('PRAGMA user_version').fetchone()[0]) != len(MIGRATIONS):
+            problems.append(f'upgraded DB is at version {v}, not {len(MIGRATIONS)}')
+        if schema(old) != schema(new):
+            problems.append(f'upgraded schema differs: {set(schema(old)) ^ set(schema(new))}')
+        if old.execute('SELECT name FROM Games').fetchall() != [('Old game',)]:
+            problems.append('upgrade lost data')
+        return problems
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--db-path', help='check plans against a copy of this DB instead of a small generated one')
+    a = p.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for problem in check_upgrade(tmp):
+            print(f'FAIL upgrade: {problem}')
+            failures += 1
+
+        path = os.path.join(tmp, 'plans.db')
+        if a.db_path:
+            with sqlite3.connect(a.db_path) as s, sqlite3.connect(path) as d:
+                s.backup(d)
+        with NewsDatabase(path) as db:
+            if not a.db_path:
+                seed(db)
+            for check in CHECKS:
+                plans = traced_plans(db, check.call)
+                ok = any(check.expect in detail for plan in plans for detail in plan)
+                failures += not ok
+                print(f'{"ok  " if ok else "FAIL"} [{check.migration}] {check.name}')
+                if not ok:
+                    print(f'     expected {check.expect!r} in {json.dumps(plans)}')
+
+    print(f'{len(CHECKS) + 1 - failures} passed, {failures} failed')
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Startup benchmarks: import time per module and wall time for no-op CLI runs.
+
+Every measurement is a fresh interpreter, repeated and reduced to the median.
+`--max-import-ms` turns it into a check: exit non-zero if importing steam_news
+takes longer than that.
+
+    python -m benchmarks.startup --repeat 10 --out startup.json
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#modules worth tracking individually: ours, plus the heavy third party ones
+TRACKED = (
+    'steam_news', 'database', 'metrics', 'profiling', 'steam_news_types', 'news_publisher', 'steam_unofficial_api',
+    'typed_argparse', 'dotenv', 'requests', 'PyRSS2Gen', 'bbcode', 'yarl', 'asyncio', 'sqlite3',
+)
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def import_times(module: str):
+    """Cumulative import time in microseconds of every module imported by `import module`"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    times: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if m := IMPORTTIME_LINE.match(line):
+            times[m.group(4)] = int(m.group(2))
+    return times
+
+def wall_time(args: list[str]):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--repeat', type=int, default=7)
+    p.add_argument('--max-import-ms', type=float, default=None, help='fail if importing steam_news takes longer than this')
+    p.add_argument('--out', help='write results JSON here as well as stdout')
+    a = p.parse_args()
+
+    #warm up the bytecode cache so the first run isn't measuring compilation
+    import_times('steam_news')
+
+    samples: dict[str, list[int]] = {}
+    for _ in range(a.repeat):
+        for mod, us in import_times('steam_news').items():
+            samples.setdefault(mod, []).append(us)
+
+    modules = {
+        mod: round(statistics.median(samples[mod]) / 1000, 2) if mod in samples else None
+            for mod in TRACKED
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'SteamNews.db')
+        wall_time(['steam_news.py', '--db-path', db_path]) # creates the DB
+        runs = {
+            'python -c pass': [wall_time(['-c', 'pass']) for _ in range(a.repeat)],
+            'steam_news.py --help': [wall_time(['steam_news.py', '--help']) for _ in range(a.repeat)],
+            'steam_news.py (no-op)': [wall_time(['steam_news.py', '--db-path', db_path]) for _ in range(a.repeat)],
+        }
+
+    report = {
+        'timestamp': int(time.time()),
+        'import_ms': modules,
+        'wall_ms': {name: round(statistics.median(t) * 1000, 2) for name, t in runs.items()},
+    }
+    if a.out:
+        with open(a.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if a.max_import_ms is not None and (modules['steam_news'] or 0) > a.max_import_ms:
+        print(f'Importing steam_news took {modules["steam_news"]} ms, over the {a.max_import_ms} ms limit', file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,9 @@ import sqlite3
 import logging
 import time
 
-from typing import Iterable, NamedTuple, Optional
+from typing import Iterable, Iterator, NamedTuple, Optional
 
-from steam_news_types import NewsItem
+from steam_news_types import NEWS_ROW_COLUMNS, NewsRow
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +12,120 @@ class Game(NamedTuple):
     name: str
     appid: int
 
+# Schema migrations, applied in order when a DB is opened. PRAGMA user_version is how many have been applied.
+# Don't change one that's already been released; add another instead.
+#The indentation here is more for the benefit of the sqlite3 tool
+# than the python source... /shrug
+MIGRATIONS: list[tuple[str, ...]] = [
+    # 1: the original first_run() schema. IF NOT EXISTS since DBs from before user_version was tracked have it at version 0
+    (
+        '''CREATE TABLE IF NOT EXISTS Games(
+            appid INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            shouldFetch INTEGER NOT NULL DEFAULT 1)''',
+        '''CREATE TABLE IF NOT EXISTS ExpireTimes(
+            appid INTEGER PRIMARY KEY
+                REFERENCES Games(appid) ON DELETE CASCADE ON UPDATE CASCADE,
+            unixseconds INTEGER NOT NULL DEFAULT 0)''',
+        #having news item appid foreign key on games can break,
+        # since the news appid might not be the one we fetched against
+        '''CREATE TABLE IF NOT EXISTS NewsItems(
+            gid TEXT NOT NULL PRIMARY KEY,
+            title TEXT NOT NULL,
+            url TEXT,
+            is_external_url INTEGER,
+            author TEXT,
+            contents TEXT,
+            feedlabel TEXT,
+            date INTEGER NOT NULL DEFAULT (strftime('%s')),
+            feedname TEXT,
+            feed_type INTEGER,
+            appid INTEGER NOT NULL)''',
+        #FK in NewsSources -> Games is fine, though removing entries
+        # from NewsSources could lead to loss of data useful for publishing...
+        '''CREATE TABLE IF NOT EXISTS NewsSources(
+            gid TEXT NOT NULL
+                REFERENCES NewsItems(gid) ON DELETE CASCADE ON UPDATE CASCADE,
+            appid INTEGER NOT NULL
+                REFERENCES Games(appid) ON DELETE CASCADE ON UPDATE CASCADE,
+            PRIMARY KEY(gid, appid))''',
+        'CREATE INDEX IF NOT EXISTS NewsDateIdx ON NewsItems(date)',
+        'CREATE INDEX IF NOT EXISTS NewsSourceAppIDIdx ON NewsSources(appid)',
+    ),
+    # 2: tables that used to be created with IF NOT EXISTS on every open
+    (
+        '''CREATE TABLE IF NOT EXISTS Clans(
+            appid INTEGER PRIMARY KEY,
+            clanid INTEGER,
+            vanity_url TEXT,
+            updated INTEGER NOT NULL DEFAULT (strftime('%s')))''',
+        '''CREATE TABLE IF NOT EXISTS NewsTags(
+            gid TEXT NOT NULL
+                REFERENCES NewsItems(gid) ON DELETE CASCADE ON UPDATE CASCADE,
+            tag TEXT NOT NULL,
+            PRIMARY KEY(gid, tag))''',
+        '''CREATE TABLE IF NOT EXISTS Users(
+            name TEXT NOT NULL PRIMARY KEY,
+            steamid INTEGER)''',
+        '''CREATE TABLE IF NOT EXISTS UserGames(
+            user TEXT NOT NULL
+                REFERENCES Users(name) ON DELETE CASCADE ON UPDATE CASCADE,
+            appid INTEGER NOT NULL
+                REFERENCES Games(appid) ON DELETE CASCADE ON UPDATE CASCADE,
+            shouldFetch INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY(user, appid))''',
+        'CREATE INDEX IF NOT EXISTS UserGamesAppIDIdx ON UserGames(appid)',
+        '''CREATE TABLE IF NOT EXISTS FetchRuns(
+            runid INTEGER PRIMARY KEY,
+            started INTEGER NOT NULL DEFAULT (strftime('%s')),
+            finished INTEGER)''',
+        '''CREATE TABLE IF NOT EXISTS FetchRunApps(
+            runid INTEGER NOT NULL
+                REFERENCES FetchRuns(runid) ON DELETE CASCADE ON UPDATE CASCADE,
+            appid INTEGER NOT NULL,
+            result TEXT NOT NULL,
+            PRIMARY KEY(runid, appid))''',
+    ),
+    # 3: indexes for the hot queries (benchmarks/query_plans.py checks they get used).
+    # gid lookups in NewsSources are already covered by its (gid, appid) primary key.
+    (
+        #the 30 day window (get_news_rows, get_recent_gids, and the joins in get_high_water_marks/get_news_tags)
+        # can get gids straight from the index instead of from each row
+        'CREATE INDEX NewsDateGidIdx ON NewsItems(date, gid)',
+        'DROP INDEX NewsDateIdx',
+        #apps whose cached news hasn't expired yet, for get_cached_appids
+        'CREATE INDEX ExpireTimesDueIdx ON ExpireTimes(unixseconds, appid)',
+        #usually only some of a library is fetched, so get_fetch_games only has to look at those
+        'CREATE INDEX GamesFetchIdx ON Games(appid, name) WHERE shouldFetch != 0',
+        'CREATE INDEX UserGamesFetchIdx ON UserGames(appid) WHERE shouldFetch != 0',
+    ),
+]
+
+ITEM_UPSERT = ', '.join(f'{col} = excluded.{col}' for col in NewsRow._fields if col != 'gid')
+
+def news_row_factory(cursor: sqlite3.Cursor, row: tuple) -> NewsRow:
+    return NewsRow._make(row)
+
+class HighWaterMark(NamedTuple):
+    """The newest stored news item for an app, plus every recent gid it's a source of"""
+    date: int
+    gid: str
+    known_gids: set[str]
+
+#appid -> clan id mappings basically never change
+CLAN_CACHE_TTL = 90 * 24 * 60 * 60
+
+#how long an unfinished fetch run is worth resuming: about as long as Steam says to cache news for,
+# after which the apps it already fetched are due again anyway
+FETCH_RUN_MAX_AGE = 60 * 60
+
+#keep IN (...) lists under SQLite's default host parameter limit
+MAX_SQL_PARAMS = 500
+
+def chunked(items: list, n: int = MAX_SQL_PARAMS):
+    for i in range(0, len(items), n):
+        yield items[i:i + n]
+
 class NewsDatabase:
     db: Optional[sqlite3.Connection]
 
@@ -25,6 +139,7 @@ class NewsDatabase:
             self.db = sqlite3.connect(self.path)
             self.db.row_factory = sqlite3.Row
             self.db.execute('PRAGMA foreign_keys = ON')
+            self.migrate()
 
     def close(self, optimize=True):
         if self.db:
@@ -44,109 +159,154 @@ class NewsDatabase:
         self.close(optimize=exc_type is None)
         return False
 
-    def first_run(self):
+    def get_schema_version(self) -> int:
         if not self.db:
             raise TypeError('DB not initialized')
 
-        #The indentation here is more for the benefit of the sqlite3 tool
-        # than the python source... /shrug
-        self.db.executescript('''
-            CREATE TABLE Games(
-                appid INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                shouldFetch INTEGER NOT NULL DEFAULT 1);
-            CREATE TABLE ExpireTimes(
-                appid INTEGER PRIMARY KEY
-                    REFERENCES Games(appid) ON DELETE CASCADE ON UPDATE CASCADE,
-                unixseconds INTEGER NOT NULL DEFAULT 0);
-            CREATE TABLE NewsItems(
-                gid TEXT NOT NULL PRIMARY KEY,
-                title TEXT NOT NULL,
-                url TEXT,
-                is_external_url INTEGER,
-                author TEXT,
-                contents TEXT,
-                feedlabel TEXT,
-                date INTEGER NOT NULL DEFAULT (strftime('%s')),
-                feedname TEXT,
-                feed_type INTEGER,
-                appid INTEGER NOT NULL);
-            CREATE TABLE NewsSources(
-                gid TEXT NOT NULL
-                    REFERENCES NewsItems(gid) ON DELETE CASCADE ON UPDATE CASCADE,
-                appid INTEGER NOT NULL
-                    REFERENCES Games(appid) ON DELETE CASCADE ON UPDATE CASCADE,
-                PRIMARY KEY(gid, appid));
-            CREATE INDEX NewsDateIdx ON NewsItems(date);
-            CREATE INDEX NewsSourceAppIDIdx ON NewsSources(appid);
-        ''')
+        return self.db.execute('PRAGMA user_version').fetchone()[0]
 
-        #having news item appid foreign key on games can break,
-        # since the news appid might not be the one we fetched against
-        #FK in NewsSources -> Games is fine, though removing entries
-        # from NewsSources could lead to loss of data useful for publishing...
-        self.db.commit()
-        logger.info('Created DB tables!')
+    def migrate(self):
+        """Apply any migrations the DB doesn't have yet, each in its own transaction"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        version = self.get_schema_version()
+        if version > len(MIGRATIONS):
+            logger.warning('DB @ %s has schema version %d, newer than this code knows about (%d).', self.path, version, len(MIGRATIONS))
+        for i in range(version, len(MIGRATIONS)):
+            with self.db as db:
+                db.execute('BEGIN IMMEDIATE')
+                #another process may have got here first
+                if db.execute('PRAGMA user_version').fetchone()[0] > i:
+                    continue
+                for sql in MIGRATIONS[i]:
+                    db.execute(sql)
+                db.execute(f'PRAGMA user_version = {i + 1}')
+            logger.info('Migrated DB to schema version %d.', i + 1)
+
+    def first_run(self):
+        """Create the tables. open() already does this (and upgrades older DBs), so this only makes sure of it."""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        self.migrate()
 
-    def add_games(self, games: dict[int, str]):
+    def add_games(self, games: dict[int, str], should_fetch: bool = True):
         """Given a dict of appid: name, populate them in the database."""
         if not self.db:
             raise TypeError('DB not initialized')
 
         with self.db as db:
-            cur = db.executemany('INSERT OR IGNORE INTO Games VALUES (?, ?, 1)', games.items())
-            logger.info('Added %d new games to be fetched.', cur.rowcount)
+            cur = db.executemany(f'INSERT OR IGNORE INTO Games VALUES (?, ?, {1 if should_fetch else 0})', games.items())
+            logger.info('Added %d new games%s.', cur.rowcount, ' to be fetched' if should_fetch else '')
+
+    # Users: several people's feeds out of one DB. Each user has their own set of games and shouldFetch flags
+    # in UserGames; Games.shouldFetch is still there for the DB's "own" feed. Fetching covers every game
+    # anyone wants, once, and publish can route the news into a feed per user.
+
+    def add_user(self, name: str, steamid: Optional[int] = None):
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        with self.db as db:
+            db.execute('''
+                INSERT INTO Users VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET steamid = coalesce(excluded.steamid, steamid)
+            ''', (name, steamid))
+
+    def add_user_games(self, user: str, appids: Iterable[int]):
+        """Give a user games (already in Games), fetched by default"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        with self.db as db:
+            cur = db.executemany('INSERT OR IGNORE INTO UserGames VALUES (?, ?, 1)', ((user, aid) for aid in appids))
+            logger.info('Added %d new games to be fetched for %s.', cur.rowcount, user)
 
-    def get_games_like(self, name: str):
+    def get_users(self) -> list[str]:
         if not self.db:
             raise TypeError('DB not initialized')
 
+        return [name for (name,) in self.db.execute('SELECT name FROM Users ORDER BY name')]
+
+    def get_user_fetch_apps(self) -> dict[int, list[str]]:
+        """For each appid some user fetches, the users fetching it"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        users_by_app: dict[int, list[str]] = {}
+        for appid, user in self.db.execute('SELECT appid, user FROM UserGames WHERE shouldFetch != 0'):
+            users_by_app.setdefault(appid, []).append(user)
+        return users_by_app
+
+    def get_games_like(self, name: str, user: Optional[str] = None):
+        """Games with names like name, with their shouldFetch (for user, if given)"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        if user is None:
+            source, params = 'Games', ()
+        else:
+            source, params = '''(
+                SELECT Games.appid, Games.name, UserGames.shouldFetch
+                FROM UserGames JOIN Games ON Games.appid = UserGames.appid
+                WHERE UserGames.user = ?)''', (user,)
         if name := name.strip().strip('%'):
             n = f'%{name}%'
-            c = self.db.execute('''
-                SELECT * FROM Games
+            c = self.db.execute(f'''
+                SELECT * FROM {source}
                 WHERE name LIKE ? ORDER BY name
-            ''', (n,))
+            ''', (*params, n))
         else:
-            c = self.db.execute('SELECT * FROM Games ORDER BY name')
+            c = self.db.execute(f'SELECT * FROM {source} ORDER BY name', params)
         return c.fetchall()
 
-    def set_fetching_ids(self, appids_and_should_fetch: Iterable[tuple[int, bool]]):
+    def _set_should_fetch(self, appids_and_should_fetch: Iterable[tuple[int, bool]], user: Optional[str]):
         if not self.db:
             raise TypeError('DB not initialized')
 
+        if user is None:
+            sql = 'UPDATE Games SET shouldFetch = ? WHERE appid = ?'
+        else:
+            sql = 'UPDATE UserGames SET shouldFetch = ? WHERE appid = ? AND user = ?'
         #sadly can't use executemany() w/ a "bare" list-- each item needs to be a tuple
         rc = 0
         with self.db as db:
             for aid, should_fetch in appids_and_should_fetch:
-                c = db.execute(f'UPDATE Games SET shouldFetch = ? WHERE appid = ?', (1 if should_fetch else 0, aid,))
+                c = db.execute(sql, (1 if should_fetch else 0, aid) + ((user,) if user is not None else ()))
                 rc += c.rowcount
+        return rc
 
+    def set_fetching_ids(self, appids_and_should_fetch: Iterable[tuple[int, bool]], user: Optional[str] = None):
+        rc = self._set_should_fetch(appids_and_should_fetch, user)
         logger.info('Set shouldFetch for %d games.', rc)
 
-    def disable_fetching_ids(self, appids: Iterable[int]):
-        if not self.db:
-            raise TypeError('DB not initialized')
+    def disable_fetching_ids(self, appids: Iterable[int], user: Optional[str] = None):
+        self._set_should_fetch(((aid, False) for aid in appids), user)
 
-        #sadly can't use executemany() w/ a "bare" list-- each item needs to be a tuple
-        with self.db as db:
-            for aid in appids:
-                db.execute('UPDATE Games SET shouldFetch = 0 WHERE appid = ?', (aid,))
+    def enable_fetching_ids(self, appids: Iterable[int], user: Optional[str] = None):
+        self._set_should_fetch(((aid, True) for aid in appids), user)
 
-    def enable_fetching_ids(self, appids: Iterable[int]):
+    def get_fetch_games(self) -> dict[int, str]:
+        """Every game to fetch news for: the DB's own, plus any user's. Each only once, however many users have it."""
         if not self.db:
             raise TypeError('DB not initialized')
 
-        with self.db as db:
-            for aid in appids:
-                db.execute('UPDATE Games SET shouldFetch = 1 WHERE appid = ?', (aid,))
+        #a UNION rather than OR, so each half can use its shouldFetch index
+        c = self.db.execute('''
+            SELECT appid, name FROM Games WHERE shouldFetch != 0
+            UNION
+            SELECT appid, name FROM Games
+            WHERE appid IN (SELECT appid FROM UserGames WHERE shouldFetch != 0)
+        ''')
+        return dict(c.fetchall())
 
-    def get_fetch_games(self) -> dict[int, str]:
+    def get_own_fetch_appids(self) -> set[int]:
+        """The games the DB itself fetches (Games.shouldFetch), leaving out ones only users want"""
         if not self.db:
             raise TypeError('DB not initialized')
 
-        c = self.db.execute('SELECT appid, name FROM Games WHERE shouldFetch != 0')
-        return dict(c.fetchall())
+        return {appid for (appid,) in self.db.execute('SELECT appid FROM Games WHERE shouldFetch != 0')}
 
     def update_expire_time(self, appid: int, expires: int):
         if not self.db:
@@ -165,32 +325,172 @@ class NewsDatabase:
         #TODO maybe use datetime.timestamp() & now() instead?
         return exptime is not None and time.time() < exptime[0]
 
-    def insert_news_item(self, ned: NewsItem):
+    def get_cached_appids(self) -> set[int]:
+        """Apps whose cached news hasn't expired yet; everything else being fetched is due"""
         if not self.db:
             raise TypeError('DB not initialized')
 
-        #TODO maybe convert the dict to a namedtuple...?
-        self.db.execute('''
-            INSERT OR IGNORE INTO NewsItems
-            VALUES (:gid, :title, :url, :is_external_url, :author, :contents, :feedlabel, :date, :feedname, :feed_type, :appid)
-        ''', ned)
+        c = self.db.execute('SELECT appid FROM ExpireTimes WHERE unixseconds > ?', (time.time(),))
+        return {appid for (appid,) in c}
+
+    def save_fetched_news(self, appid: int, expires: int, items: Iterable[tuple[NewsRow, Iterable[str]]],
+            linked_gids: Iterable[str], runid: Optional[int] = None):
+        """Store everything from fetching one app in a single transaction: new items with their tags,
+        links to items already stored, its expire time, and (in a fetch run) the journal entry saying it's done.
+        If the process dies partway, none of it happened and the app gets fetched again."""
+        if not self.db:
+            raise TypeError('DB not initialized')
 
+        items = list(items)
         with self.db as db:
-            db.execute('INSERT OR IGNORE INTO NewsSources VALUES (?, ?)', (ned['gid'], ned['realappid']))
+            db.executemany(f'''
+                INSERT OR IGNORE INTO NewsItems ({NEWS_ROW_COLUMNS})
+                VALUES ({', '.join('?' * len(NewsRow._fields))})
+            ''', (row for row, _ in items))
+            db.executemany('INSERT OR IGNORE INTO NewsTags VALUES (?, ?)', ((row.gid, tag) for row, tags in items for tag in tags))
+            db.executemany('INSERT OR IGNORE INTO NewsSources VALUES (?, ?)',
+                [(row.gid, appid) for row, _ in items] + [(gid, appid) for gid in linked_gids])
+            db.execute('INSERT OR REPLACE INTO ExpireTimes VALUES (?, ?)', (appid, expires))
+            if runid is not None:
+                db.execute('INSERT OR REPLACE INTO FetchRunApps VALUES (?, ?, ?)', (runid, appid, 'fetched'))
+
+    # Fetch run journal: which apps a fetch run has finished with, committed along with each app's news,
+    # so a run that gets killed can be picked up where it stopped by the next one.
 
-    def get_news_rows(self) -> list[NewsItem]:
+    def begin_fetch_run(self, resume: bool = True, max_age: int = FETCH_RUN_MAX_AGE) -> tuple[int, set[int]]:
+        """Resume the last unfinished fetch run, if it started within max_age seconds, or start a new one.
+        Returns its runid and the apps it's already fetched."""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        with self.db as db:
+            unfinished = db.execute('SELECT runid, started FROM FetchRuns WHERE finished IS NULL ORDER BY runid DESC').fetchone()
+            if unfinished and resume and unfinished[1] >= time.time() - max_age:
+                runid = unfinished[0]
+                #only what got fetched; anything that failed gets another go
+                done = {appid for (appid,) in db.execute("SELECT appid FROM FetchRunApps WHERE runid = ? AND result = 'fetched'", (runid,))}
+                return runid, done
+            if unfinished:
+                #abandoned, or too old to be worth resuming; close them off so they're not resumed later either
+                logger.info('Not resuming fetch run %d (started %s).', unfinished[0], time.strftime('%Y-%m-%d %H:%M', time.gmtime(unfinished[1])))
+                self._close_fetch_runs(db)
+            return db.execute('INSERT INTO FetchRuns (runid) VALUES (NULL)').lastrowid or 0, set()
+
+    def finish_fetch_run(self, runid: int):
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        with self.db as db:
+            self._close_fetch_runs(db, runid)
+
+    def _close_fetch_runs(self, db: sqlite3.Connection, runid: Optional[int] = None):
+        #the per-app journal is only needed while a run is unfinished
+        where = 'finished IS NULL' + (' AND runid = ?' if runid is not None else '')
+        params = (runid,) if runid is not None else ()
+        db.execute(f'DELETE FROM FetchRunApps WHERE runid IN (SELECT runid FROM FetchRuns WHERE {where})', params)
+        db.execute(f"UPDATE FetchRuns SET finished = strftime('%s') WHERE {where}", params)
+
+    def get_recent_gids(self) -> set[str]:
+        """gids of all news items from the last 30 days"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        c = self.db.execute('''
+            SELECT gid FROM NewsItems
+            WHERE date >= strftime('%s', 'now', '-30 day')
+        ''')
+        return {gid for (gid,) in c}
+
+    def prune_old_news(self, older_than_days: int):
+        """Delete news items older than the given number of days; their NewsSources go with them"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        with self.db as db:
+            c = db.execute('''
+                DELETE FROM NewsItems
+                WHERE date < strftime('%s', 'now', ?)
+            ''', (f'-{int(older_than_days)} day',))
+        logger.info('Pruned %d news items older than %d days.', c.rowcount, older_than_days)
+        return c.rowcount
+
+    def get_news_rows(self) -> Iterator[NewsRow]:
+        """News items from the last 30 days, newest first, streamed from the cursor"""
         if not self.db:
             raise TypeError('DB not initialized')
 
-        #TODO generator shenanigans instead of fetchall()?
         #sadly our sqlite3 version isn't new enough for unixepoch()
         # so we have to use strftime('%s') for sqlite to make a unix timestamp
-        c = self.db.execute('''
-            SELECT * FROM NewsItems
+        c = self.db.cursor()
+        c.row_factory = news_row_factory
+        return c.execute(f'''
+            SELECT {NEWS_ROW_COLUMNS} FROM NewsItems
             WHERE date >= strftime('%s', 'now', '-30 day')
             ORDER BY date DESC
         ''')
-        return c.fetchall()
+
+    def get_high_water_marks(self) -> dict[int, HighWaterMark]:
+        """For each app with news in the last 30 days, its newest item and the gids already stored for it"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        #can't NATURAL JOIN here, NewsItems.appid isn't necessarily the source appid
+        c = self.db.execute('''
+            SELECT NewsSources.appid, NewsItems.gid, NewsItems.date
+            FROM NewsSources JOIN NewsItems ON NewsItems.gid = NewsSources.gid
+            WHERE NewsItems.date >= strftime('%s', 'now', '-30 day')
+            ORDER BY NewsItems.date DESC
+        ''')
+
+        marks: dict[int, HighWaterMark] = {}
+        for appid, gid, date in c:
+            if appid in marks:
+                marks[appid].known_gids.add(gid)
+            else:
+                #newest first, so the first row seen per app is its high-water mark
+                marks[appid] = HighWaterMark(date, gid, {gid})
+        return marks
+
+    def get_data_version(self) -> int:
+        """Changes whenever another connection commits to the DB (PRAGMA data_version), for noticing new news"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        return self.db.execute('PRAGMA data_version').fetchone()[0]
+
+    def get_news_tags(self) -> dict[str, list[str]]:
+        """Tags of news items from the last 30 days, by gid; items without tags are left out"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        c = self.db.execute('''
+            SELECT NewsTags.gid, tag
+            FROM NewsTags JOIN NewsItems ON NewsItems.gid = NewsTags.gid
+            WHERE NewsItems.date >= strftime('%s', 'now', '-30 day')
+        ''')
+        tags: dict[str, list[str]] = {}
+        for gid, tag in c:
+            tags.setdefault(gid, []).append(tag)
+        return tags
+
+    def get_news_sources(self) -> dict[str, list[Game]]:
+        """The games each news item from the last 30 days was fetched for, by gid (like
+        get_source_names_and_appids_for_item, but for every item in one query)"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        c = self.db.execute('''
+            SELECT NewsSources.gid, Games.name, Games.appid
+            FROM NewsSources
+                JOIN NewsItems ON NewsItems.gid = NewsSources.gid
+                JOIN Games ON Games.appid = NewsSources.appid
+            WHERE NewsItems.date >= strftime('%s', 'now', '-30 day')
+            ORDER BY Games.appid
+        ''')
+        sources: dict[str, list[Game]] = {}
+        for gid, name, appid in c:
+            sources.setdefault(gid, []).append(Game(name, appid))
+        return sources
 
     def get_source_names_and_appids_for_item(self, gid: str) -> list[Game]:
         if not self.db:
@@ -203,3 +503,99 @@ class NewsDatabase:
         ''', (gid,))
 
         return [Game(name, appid) for (name, appid) in c.fetchall()]
+
+    def get_clan_ids(self, appids: Iterable[int], max_age: int = CLAN_CACHE_TTL) -> dict[int, Optional[int]]:
+        """Cached clan ids for whichever of the given appids have a fresh entry.
+        Apps known to have no clan map to None; apps missing from the result need fetching."""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        oldest = int(time.time()) - max_age
+        result: dict[int, Optional[int]] = {}
+        for chunk in chunked(list(appids)):
+            c = self.db.execute(f'''
+                SELECT appid, clanid FROM Clans
+                WHERE updated >= ? AND appid IN ({','.join('?' * len(chunk))})
+            ''', (oldest, *chunk))
+            result.update(c.fetchall())
+        return result
+
+    def save_clan_ids(self, clans: Iterable[tuple[int, Optional[int], Optional[str]]]):
+        """Given (appid, clanid, vanity_url) tuples, cache them. A None clanid records that the app has none."""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        now = int(time.time())
+        with self.db as db:
+            cur = db.executemany('INSERT OR REPLACE INTO Clans VALUES (?, ?, ?, ?)',
+                ((appid, clanid, vanity, now) for appid, clanid, vanity in clans))
+            logger.info('Cached %d clan ids.', cur.rowcount)
+
+    # Snapshots (see snapshot.py) carry the live data as (kind, key, value) records
+
+    def get_snapshot_records(self) -> Iterator[tuple[str, str, list]]:
+        """Everything worth keeping: games, expire times, clans, users, and news from the last 30 days
+        (with their sources and tags)"""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        for row in self.db.execute('SELECT appid, name, shouldFetch FROM Games'):
+            yield 'game', str(row[0]), list(row)
+        for row in self.db.execute('SELECT appid, unixseconds FROM ExpireTimes'):
+            yield 'expire', str(row[0]), list(row)
+        for row in self.db.execute('SELECT appid, clanid, vanity_url, updated FROM Clans'):
+            yield 'clan', str(row[0]), list(row)
+        for row in self.db.execute('SELECT name, steamid FROM Users'):
+            yield 'user', row[0], list(row)
+        for row in self.db.execute('SELECT user, appid, shouldFetch FROM UserGames'):
+            yield 'usergame', f'{row[0]}/{row[1]}', list(row)
+
+        sources: dict[str, list[int]] = {}
+        for gid, appid in self.db.execute('''
+            SELECT NewsSources.gid, NewsSources.appid
+            FROM NewsSources JOIN NewsItems ON NewsItems.gid = NewsSources.gid
+            WHERE NewsItems.date >= strftime('%s', 'now', '-30 day')
+            ORDER BY NewsSources.gid, NewsSources.appid
+        '''):
+            sources.setdefault(gid, []).append(appid)
+        tags = self.get_news_tags()
+        for row in self.get_news_rows():
+            yield 'item', row.gid, [*row, sources.get(row.gid, []), sorted(tags.get(row.gid, []))]
+
+    def load_snapshot_records(self, records: Iterable[tuple[str, list]]):
+        """Store (kind, value) records from get_snapshot_records, replacing what's there.
+        Games and users need to come before anything referring to them."""
+        if not self.db:
+            raise TypeError('DB not initialized')
+
+        n = len(NewsRow._fields)
+        count = 0
+        with self.db as db:
+            for kind, value in records:
+                #upserts rather than INSERT OR REPLACE for anything other tables refer to,
+                # since REPLACE deletes the old row first and that would cascade
+                if kind == 'game':
+                    db.execute('''
+                        INSERT INTO Games VALUES (?, ?, ?)
+                        ON CONFLICT(appid) DO UPDATE SET name = excluded.name, shouldFetch = excluded.shouldFetch
+                    ''', value)
+                elif kind == 'expire':
+                    db.execute('INSERT OR REPLACE INTO ExpireTimes VALUES (?, ?)', value)
+                elif kind == 'clan':
+                    db.execute('INSERT OR REPLACE INTO Clans VALUES (?, ?, ?, ?)', value)
+                elif kind == 'user':
+                    db.execute('INSERT INTO Users VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET steamid = excluded.steamid', value)
+                elif kind == 'usergame':
+                    db.execute('INSERT OR REPLACE INTO UserGames VALUES (?, ?, ?)', value)
+                elif kind == 'item':
+                    row = NewsRow._make(value[:n])
+                    db.execute(f'''
+                        INSERT INTO NewsItems ({NEWS_ROW_COLUMNS}) VALUES ({", ".join("?" * n)})
+                        ON CONFLICT(gid) DO UPDATE SET {ITEM_UPSERT}
+                    ''', row)
+                    db.executemany('INSERT OR IGNORE INTO NewsSources VALUES (?, ?)', ((row.gid, appid) for appid in value[n]))
+                    db.executemany('INSERT OR IGNORE INTO NewsTags VALUES (?, ?)', ((row.gid, tag) for tag in value[n + 1]))
+                else:
+                    raise ValueError(f'Unknown snapshot record kind: {kind}')
+                count += 1
+        logger.info('Loaded %d records from snapshot.', count)
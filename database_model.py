@@ -12,26 +12,34 @@ class BaseModel(Model):
         def database(self):
             return database
 
+# Mirrors database.MIGRATIONS; keep them in step
+
 class Game(BaseModel):
-    appid = AutoField(null=True)
+    appid = IntegerField(primary_key=True)
     name = TextField()
     should_fetch = IntegerField(column_name='shouldFetch', constraints=[SQL("DEFAULT 1")])
 
     class Meta:
         table_name = 'Games'
+        indexes = (
+            SQL('CREATE INDEX GamesFetchIdx ON Games(appid, name) WHERE shouldFetch != 0'),
+        )
 
 class ExpireTime(BaseModel):
-    appid = ForeignKeyField(column_name='appid', field='appid', model=Game, null=True, primary_key=True)
+    appid = ForeignKeyField(column_name='appid', field='appid', model=Game, null=True, primary_key=True, on_delete='CASCADE', on_update='CASCADE')
     unixseconds = IntegerField(constraints=[SQL("DEFAULT 0")])
 
     class Meta:
         table_name = 'ExpireTimes'
+        indexes = (
+            (('unixseconds', 'appid'), False),
+        )
 
 class NewsItem(BaseModel):
     appid = IntegerField()
     author = TextField(null=True)
     contents = TextField(null=True)
-    date = IntegerField(constraints=[SQL("DEFAULT strftime('%s')")], index=True)
+    date = IntegerField(constraints=[SQL("DEFAULT (strftime('%s'))")])
     feed_type = IntegerField(null=True)
     feedlabel = TextField(null=True)
     feedname = TextField(null=True)
@@ -42,17 +50,70 @@ class NewsItem(BaseModel):
 
     class Meta:
         table_name = 'NewsItems'
+        indexes = (
+            (('date', 'gid'), False),
+        )
 
 class NewsSource(BaseModel):
-    appid = ForeignKeyField(column_name='appid', field='appid', model=Game)
-    gid = ForeignKeyField(column_name='gid', field='gid', model=NewsItem)
+    appid = ForeignKeyField(column_name='appid', field='appid', model=Game, on_delete='CASCADE', on_update='CASCADE')
+    gid = ForeignKeyField(column_name='gid', field='gid', model=NewsItem, index=False, on_delete='CASCADE', on_update='CASCADE')
 
     class Meta:
         table_name = 'NewsSources'
+        primary_key = CompositeKey('gid', 'appid')
+
+class NewsTag(BaseModel):
+    gid = ForeignKeyField(column_name='gid', field='gid', model=NewsItem, index=False, on_delete='CASCADE', on_update='CASCADE')
+    tag = TextField()
+
+    class Meta:
+        table_name = 'NewsTags'
+        primary_key = CompositeKey('gid', 'tag')
+
+class Clan(BaseModel):
+    appid = IntegerField(primary_key=True)
+    clanid = IntegerField(null=True)
+    vanity_url = TextField(null=True)
+    updated = IntegerField(constraints=[SQL("DEFAULT (strftime('%s'))")])
+
+    class Meta:
+        table_name = 'Clans'
+
+class User(BaseModel):
+    name = TextField(primary_key=True)
+    steamid = IntegerField(null=True)
+
+    class Meta:
+        table_name = 'Users'
+
+class UserGame(BaseModel):
+    user = ForeignKeyField(column_name='user', field='name', model=User, index=False, on_delete='CASCADE', on_update='CASCADE')
+    appid = ForeignKeyField(column_name='appid', field='appid', model=Game, on_delete='CASCADE', on_update='CASCADE')
+    should_fetch = IntegerField(column_name='shouldFetch', constraints=[SQL("DEFAULT 1")])
+
+    class Meta:
+        table_name = 'UserGames'
+        primary_key = CompositeKey('user', 'appid')
         indexes = (
-            (('gid', 'appid'), True),
+            SQL('CREATE INDEX UserGamesFetchIdx ON UserGames(appid) WHERE shouldFetch != 0'),
         )
-        primary_key = CompositeKey('appid', 'gid')
+
+class FetchRun(BaseModel):
+    runid = AutoField()
+    started = IntegerField(constraints=[SQL("DEFAULT (strftime('%s'))")])
+    finished = IntegerField(null=True)
+
+    class Meta:
+        table_name = 'FetchRuns'
+
+class FetchRunApp(BaseModel):
+    runid = ForeignKeyField(column_name='runid', field='runid', model=FetchRun, index=False, on_delete='CASCADE', on_update='CASCADE')
+    appid = IntegerField()
+    result = TextField()
+
+    class Meta:
+        table_name = 'FetchRunApps'
+        primary_key = CompositeKey('runid', 'appid')
 
 def open(path: str):
     database = SqliteDatabase(path)
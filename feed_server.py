@@ -0,0 +1,221 @@
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Collection, NamedTuple, Optional
+
+from database import NewsDatabase
+import news_publisher
+
+# --serve: keeps the rendered feeds in memory (plus gzipped copies) and serves them over HTTP,
+# with ETag/Last-Modified so polling clients mostly get a 304.
+# A background thread with its own DB connection watches PRAGMA data_version and re-renders
+# when a fetch (in another process) commits; the new set of responses is swapped in all at once.
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    # application/xml rather than rss+xml so browsers apply style.xsl, as it recommends
+    '.xml': 'application/xml; charset=utf-8',
+    '.atom': 'application/atom+xml; charset=utf-8',
+    '.json': 'application/feed+json; charset=utf-8',
+    '.xsl': 'text/xsl; charset=utf-8',
+}
+
+# Re-render at least this often even if the DB didn't change, since items age out of the 30 day window
+REBUILD_EVERY = 60 * 60
+
+class Resource(NamedTuple):
+    body: bytes
+    gzipped: bytes
+    etag: str
+    last_modified: float
+    content_type: str
+    cache_control: str
+
+    @classmethod
+    def create(cls, path: str, body: bytes, cache_control: str = 'no-cache'):
+        return cls(
+            body,
+            gzip.compress(body, compresslevel=9, mtime=0),
+            '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+            time.time(),
+            CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream'),
+            cache_control,
+        )
+
+def accepts_gzip(accept_encoding: str):
+    """Whether gzip is acceptable (RFC 9110 12.5.3): an explicit gzip entry decides, and * only counts without one"""
+    qvalues: dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        coding, *params = (x.strip() for x in part.split(';'))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value.strip())
+                except ValueError:
+                    q = 0.0
+        coding = coding.lower()
+        if coding == 'x-gzip':
+            coding = 'gzip'
+        qvalues.setdefault(coding, q)
+    q = qvalues.get('gzip', qvalues.get('*', 0.0))
+    return q > 0
+
+def etag_matches(if_none_match: str, etag: str):
+    if if_none_match.strip() == '*':
+        return True
+    #weak comparison, and the gzipped variant's etag counts as the same
+    return etag.strip('"') in (x.strip().removeprefix('W/').strip('"').removesuffix('-gzip') for x in if_none_match.split(','))
+
+class FeedServer:
+    def __init__(self, db_path: str, name: str = 'steam_news.xml', feeds: Collection[str] = (), formats: Collection[str] = (),
+            poll_interval: float = 5):
+        self.db_path = db_path
+        self.name = os.path.basename(name)
+        self.feeds = feeds
+        self.formats = news_publisher.check_feed_options(self.name, feeds, formats)
+        # The combined feed in the first format, where / redirects to
+        self.index = '/' + next(iter(news_publisher.format_paths(self.name, self.formats).values()))
+        self.poll_interval = poll_interval
+        # Replaced wholesale on every rebuild, never modified, so request threads can read it without locks
+        self.resources: dict[str, Resource] = {}
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def render(self, db: NewsDatabase):
+        """Render every document that's served, by URL path"""
+        items, routed = news_publisher.render_feeds(db, self.feeds)
+        documents = dict(news_publisher.feed_documents(self.name, news_publisher.COMBINED_FEED, items, self.formats))
+        for (kind, key), feed in routed.items():
+            documents.update(news_publisher.feed_documents(
+                news_publisher.feed_path('', kind, key), feed.meta, feed.items, self.formats, '../style.xsl'))
+        return {'/' + path.replace(os.sep, '/'): document.encode() for path, document in documents.items()}
+
+    def rebuild(self, db: NewsDatabase):
+        start = time.perf_counter()
+        old = self.resources
+        resources: dict[str, Resource] = {}
+        for path, body in self.render(db).items():
+            #keep the old response (and so its Last-Modified) if nothing changed
+            if (prev := old.get(path)) and prev.body == body:
+                resources[path] = prev
+            else:
+                resources[path] = Resource.create(path, body)
+        resources['/style.xsl'] = old.get('/style.xsl') or Resource.create('style.xsl', self._read_stylesheet(), 'max-age=86400')
+        self.resources = resources
+        changed = sum(1 for path, res in resources.items() if old.get(path) is not res)
+        logger.info('Rendered %d documents (%d changed) in %.2fs', len(resources), changed, time.perf_counter() - start)
+
+    def _read_stylesheet(self):
+        with open('style.xsl', 'rb') as f:
+            return f.read()
+
+    def _watch(self):
+        try:
+            with NewsDatabase(self.db_path) as db:
+                self.rebuild(db)
+                self._ready.set()
+                version = db.get_data_version()
+                built = time.monotonic()
+                while not self._stop.wait(self.poll_interval):
+                    if (new_version := db.get_data_version()) != version or time.monotonic() - built > REBUILD_EVERY:
+                        version = new_version
+                        built = time.monotonic()
+                        try:
+                            self.rebuild(db)
+                        except Exception:
+                            #keep serving the last good version
+                            logger.exception('Failed to re-render feeds')
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            raise
+
+    def serve(self, host: str = '', port: int = 8080):
+        watcher = threading.Thread(target=self._watch, name='feed-watcher', daemon=True)
+        watcher.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+
+        httpd = ThreadingHTTPServer((host, port), FeedRequestHandler)
+        httpd.feed_server = self # type: ignore[attr-defined]
+        logger.info('Serving %d documents on http://%s:%d%s', len(self.resources), host or 'localhost', httpd.server_address[1], self.index)
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            logger.info('Stopping server')
+        finally:
+            self._stop.set()
+            httpd.server_close()
+
+class FeedRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'steam-news'
+
+    def do_GET(self):
+        self.respond(head=False)
+
+    def do_HEAD(self):
+        self.respond(head=True)
+
+    def respond(self, head: bool):
+        feed_server: FeedServer = self.server.feed_server # type: ignore[attr-defined]
+        path = self.path.split('?', 1)[0]
+        if path == '/':
+            self.send_response(HTTPStatus.FOUND)
+            self.send_header('Location', feed_server.index)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        res = feed_server.resources.get(path)
+        if res is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        gzipped = accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        etag = res.etag[:-1] + '-gzip"' if gzipped else res.etag
+        if self.not_modified(res):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_common_headers(res, etag)
+            self.end_headers()
+            return
+
+        body = res.gzipped if gzipped else res.body
+        self.send_response(HTTPStatus.OK)
+        self.send_common_headers(res, etag)
+        self.send_header('Content-Type', res.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def not_modified(self, res: Resource):
+        if (if_none_match := self.headers.get('If-None-Match')) is not None:
+            return etag_matches(if_none_match, res.etag)
+        if if_modified_since := self.headers.get('If-Modified-Since'):
+            try:
+                return int(res.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def send_common_headers(self, res: Resource, etag: str):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(res.last_modified, usegmt=True))
+        self.send_header('Cache-Control', res.cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+
+    def log_message(self, format, *args):
+        logger.debug('%s %s', self.address_string(), format % args)
@@ -0,0 +1,179 @@
+import logging
+import os
+from datetime import date
+from html import escape
+from typing import Iterable
+
+from database import Game
+from news_publisher import COMBINED_FEED, FeedMeta, RenderedItem
+
+# A static HTML version of the feed: an index of the newest items, a page per week listing that week's items,
+# and a page per game with its items in full. Browsers get plain HTML instead of running style.xsl over the whole feed.
+# Pages only depend on the items in them (no "generated at" times), and files are only rewritten
+# when their content changed, so re-publishing leaves untouched pages (and their mtimes/ETags) alone.
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 50
+
+STYLESHEET = os.path.join('styling', 'styles.css')
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<link rel="stylesheet" href="{root}styles.css">
+</head>
+<body>
+<div class="container-md px-3 py-3 markdown-body">
+<header class="py-5">
+<h1 class="border-0">{title}</h1>
+<p>{description}</p>
+{nav}
+</header>
+{body}
+{nav}
+</div>
+</body>
+</html>
+'''
+
+def format_date(item: RenderedItem):
+    return item.pub_date.strftime('%Y-%m-%d %H:%M UTC')
+
+def game_href(root: str, game: Game):
+    return f'{root}games/{game.appid}.html'
+
+def game_links(root: str, games: list[Game]):
+    return ', '.join(
+        f'<a class="link-gray" href="{game_href(root, game)}">{escape(game.name)}</a>' if game.appid else escape(game.name)
+            for game in games
+    )
+
+def item_heading(item: RenderedItem):
+    title = escape(item.title)
+    if item.link:
+        title = f'<a class="link-gray" href="{escape(item.link)}">{title}</a>'
+    return f'<h3 class="mb-0">{title}</h3>'
+
+def index_item(root: str, item: RenderedItem):
+    return f'''<div class="pb-5">
+{item_heading(item)}
+<small class="text-gray">{format_date(item)} &middot; {escape(item.source)} &middot; {game_links(root, item.games)}</small>
+</div>'''
+
+def full_item(item: RenderedItem):
+    # item.html already has the "Via <source> for <games>" line at the top
+    return f'''<article class="pb-5">
+{item_heading(item)}
+<small class="text-gray">{format_date(item)}</small>
+{item.html}
+</article>'''
+
+def week_key(item: RenderedItem):
+    """The ISO week an item's from, e.g. 2024-W07. Weeks are what the list pages are split by,
+    since an item's week never changes: as the 30 day window slides, only the newest and oldest week pages do."""
+    year, week, _ = item.pub_date.isocalendar()
+    return f'{year}-W{week:02}'
+
+def week_label(key: str):
+    year, week = key.split('-W')
+    return f'Week of {date.fromisocalendar(int(year), int(week), 1).isoformat()}'
+
+def week_href(root: str, key: str):
+    return f'{root}page/{key}.html'
+
+def week_nav(root: str, weeks: list[str], i: int):
+    """weeks are newest first"""
+    links = []
+    if i > 0:
+        links.append(f'<a href="{week_href(root, weeks[i - 1])}">&larr; Newer</a>')
+    links.append(f'<a href="{root}index.html">Latest</a>')
+    if i < len(weeks) - 1:
+        links.append(f'<a href="{week_href(root, weeks[i + 1])}">Older &rarr;</a>')
+    return f'<nav class="py-3">{" &middot; ".join(links)}</nav>'
+
+def render_page(root: str, meta: FeedMeta, body: str, nav: str = ''):
+    return PAGE_TEMPLATE.format(title=escape(meta.title), description=escape(meta.description), root=root, body=body, nav=nav)
+
+def site_pages(items: list[RenderedItem], page_size: int = PAGE_SIZE):
+    """Every page of the site, as (path relative to the site, HTML)"""
+    by_week: dict[str, list[RenderedItem]] = {}
+    for item in items:
+        by_week.setdefault(week_key(item), []).append(item)
+    weeks = sorted(by_week, reverse=True)
+
+    week_links = ' &middot; '.join(f'<a href="{week_href("", key)}">{week_label(key)}</a>' for key in weeks)
+    nav = f'<nav class="py-3">By week: {week_links}</nav>' if weeks else ''
+    body = '\n'.join(index_item('', x) for x in items[:page_size]) or '<p>No news in the last 30 days.</p>'
+    yield 'index.html', render_page('', COMBINED_FEED, body, nav)
+
+    for i, key in enumerate(weeks):
+        meta = COMBINED_FEED._replace(title=f'{COMBINED_FEED.title}: {week_label(key)}')
+        body = '\n'.join(index_item('../', x) for x in by_week[key])
+        yield week_href('', key), render_page('../', meta, body, week_nav('../', weeks, i))
+
+    by_game: dict[int, tuple[Game, list[RenderedItem]]] = {}
+    for item in items:
+        for game in item.games:
+            if game.appid:
+                by_game.setdefault(game.appid, (game, []))[1].append(item)
+    for game, game_items in by_game.values():
+        meta = FeedMeta(f'{game.name} News', f'https://store.steampowered.com/news/app/{game.appid}', f'Steam news for {game.name}')
+        nav = f'<nav class="py-3"><a href="../index.html">&larr; All news</a> &middot; <a href="https://store.steampowered.com/app/{game.appid}/">Store page</a></nav>'
+        yield game_href('', game), render_page('../', meta, '\n'.join(full_item(x) for x in game_items), nav)
+
+def write_if_changed(path: str, content: bytes):
+    """Write content to path unless it already has exactly that. Returns whether it was written."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+    return True
+
+def remove_stale(site_dir: str, subdir: str, keep: Iterable[str]):
+    """Delete generated pages in site_dir/subdir that weren't generated this time, e.g. games with no news left"""
+    keep = set(keep)
+    try:
+        names = os.listdir(os.path.join(site_dir, subdir))
+    except FileNotFoundError:
+        return 0
+    stale = [name for name in names if name.endswith('.html') and f'{subdir}/{name}' not in keep]
+    for name in stale:
+        #along with any precompressed copies
+        for other in names:
+            if other == name or other.startswith(name + '.'):
+                os.remove(os.path.join(site_dir, subdir, other))
+    return len(stale)
+
+def write_site(site_dir: str, items: list[RenderedItem], page_size: int = PAGE_SIZE):
+    """Write the HTML site for items (newest first) to site_dir, only touching pages that changed.
+    Returns the paths written."""
+    os.makedirs(os.path.join(site_dir, 'page'), exist_ok=True)
+    os.makedirs(os.path.join(site_dir, 'games'), exist_ok=True)
+
+    generated: list[str] = []
+    written: list[str] = []
+    for rel, html in site_pages(items, page_size):
+        generated.append(rel)
+        path = os.path.join(site_dir, *rel.split('/'))
+        if write_if_changed(path, html.encode()):
+            written.append(path)
+
+    removed = sum(remove_stale(site_dir, subdir, generated) for subdir in ('page', 'games'))
+
+    css_path = os.path.join(site_dir, 'styles.css')
+    with open(STYLESHEET, 'rb') as f:
+        if write_if_changed(css_path, f.read()):
+            written.append(css_path)
+
+    logger.info('HTML site: %d pages, %d files rewritten, %d pages removed', len(generated), len(written), removed)
+    return written
@@ -0,0 +1,188 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# Minimal counters/gauges/histograms for a single run, written out at the end as
+# either a node-exporter textfile (https://github.com/prometheus/node_exporter#textfile-collector)
+# or plain JSON.
+
+logger = logging.getLogger(__name__)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+def label_key(labels: dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def format_labels(key: LabelKey, extra: Optional[tuple[str, str]] = None):
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def format_value(v: float):
+    if math.isinf(v):
+        return '+Inf' if v > 0 else '-Inf'
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class Metric(ABC):
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def samples(self) -> Iterator[tuple[str, LabelKey, Optional[tuple[str, str]], float]]:
+        """(sample name, labels, extra label e.g. le=..., value) for each line of the textfile"""
+
+    @abstractmethod
+    def to_json(self) -> object:
+        """The metric's values, for the JSON output"""
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: object):
+        key = label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: object):
+        return self.values.get(label_key(labels), 0)
+
+    def samples(self):
+        for key, v in self.values.items():
+            yield self.name, key, None, v
+
+    def to_json(self):
+        return [{'labels': dict(key), 'value': v} for key, v in self.values.items()]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: object):
+        with self._lock:
+            self.values[label_key(labels)] = value
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        #per label set: [bucket counts..., sum, count]
+        self.values: dict[LabelKey, list[float]] = {}
+
+    def observe(self, value: float, **labels: object):
+        key = label_key(labels)
+        with self._lock:
+            v = self.values.get(key)
+            if v is None:
+                v = self.values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    v[i] += 1
+                    break
+            v[-2] += value
+            v[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: object):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        for key, v in self.values.items():
+            cumulative = 0.0
+            for bound, n in zip(self.buckets, v):
+                cumulative += n
+                yield f'{self.name}_bucket', key, ('le', format_value(bound)), cumulative
+            yield f'{self.name}_sum', key, None, v[-2]
+            yield f'{self.name}_count', key, None, v[-1]
+
+    def to_json(self):
+        return [
+            {
+                'labels': dict(key),
+                'count': v[-1],
+                'sum': v[-2],
+                'mean': v[-2] / v[-1] if v[-1] else None,
+                'buckets': {format_value(b): n for b, n in zip(self.buckets, v)},
+            } for key, v in self.values.items()
+        ]
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def _get(self, cls, name: str, *args):
+        if (m := self.metrics.get(name)) is None:
+            m = self.metrics[name] = cls(name, *args)
+        return m
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets)
+
+    def to_textfile(self):
+        lines: list[str] = []
+        for m in self.metrics.values():
+            if not m.values: # type: ignore[attr-defined]
+                continue
+            lines.append(f'# HELP {m.name} {m.help}')
+            lines.append(f'# TYPE {m.name} {m.kind}')
+            for name, key, extra, value in m.samples():
+                lines.append(f'{name}{format_labels(key, extra)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        return {m.name: {'type': m.kind, 'help': m.help, 'values': m.to_json()} for m in self.metrics.values()}
+
+    def write(self, path: str):
+        """Write all metrics to path: JSON if it ends in .json, otherwise Prometheus text format.
+        Written to a temp file and renamed, so the textfile collector never sees half a file."""
+        content = json.dumps(self.to_json(), indent=2) if path.endswith('.json') else self.to_textfile()
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(content)
+        os.replace(tmp, path)
+        logger.info('Wrote metrics to %s', path)
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram('steam_news_http_request_seconds', 'Time taken by HTTP requests to Steam, by endpoint')
+HTTP_RESPONSE_BYTES = REGISTRY.counter('steam_news_http_response_bytes_total', 'Bytes received from Steam, by endpoint')
+HTTP_ERRORS = REGISTRY.counter('steam_news_http_errors_total', 'Failed HTTP requests to Steam, by endpoint')
+FETCH_APPS = REGISTRY.counter('steam_news_fetch_apps_total', 'Apps processed by fetch, by result (cached, fetched, failed, resumed)')
+FETCH_CACHE_HIT_RATIO = REGISTRY.gauge('steam_news_fetch_cache_hit_ratio', 'Fraction of apps whose news was still cached')
+NEWS_ITEMS_SAVED = REGISTRY.counter('steam_news_items_saved_total', 'News items saved by fetch, by kind (new, linked)')
+DB_TRANSACTION_SECONDS = REGISTRY.histogram('steam_news_db_transaction_seconds', 'Time spent in DB writes, by operation')
+RENDER_ITEM_SECONDS = REGISTRY.histogram('steam_news_render_item_seconds', 'Time to render one news item for the feed',
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+PUBLISH_SECONDS = REGISTRY.gauge('steam_news_publish_seconds', 'Total time taken by publish')
+PUBLISH_ITEMS = REGISTRY.gauge('steam_news_publish_items', 'News items in the published feed')
+RUN_SECONDS = REGISTRY.gauge('steam_news_run_seconds', 'Total time taken by the run')
+RUN_TIMESTAMP = REGISTRY.gauge('steam_news_run_timestamp_seconds', 'Unix time the run finished')
+RUN_SUCCESS = REGISTRY.gauge('steam_news_run_success', 'Whether the run finished without an exception')
@@ -1,19 +1,27 @@
 #!/usr/bin/env python3
 
+from dataclasses import dataclass, field
 import io
+import json
 import logging
 from datetime import datetime, timezone
 import difflib
 from functools import partial
+import hashlib
 import os
+import re
 import shutil
-from typing import cast
+import time
+from typing import Callable, Collection, Iterable, NamedTuple, Optional, cast
+from xml.sax.saxutils import XMLGenerator, escape, quoteattr
 
 import PyRSS2Gen as rss
 import bbcode
-from steam_news_types import NewsItem
+from steam_news_types import EventTypes, NewsRow
 
 from database import Game, NewsDatabase
+import metrics
+import profiling
 
 # Generate RSS, see:
 # https://cyber.harvard.edu/rss/rss.html
@@ -23,13 +31,46 @@ from database import Game, NewsDatabase
 
 logger = logging.getLogger(__name__)
 
-def gen_rss_feed(rssitems: list[rss.RSSItem]):
+class FeedMeta(NamedTuple):
+    title: str
+    link: str
+    description: str
+    # Stable name for the feed, used to build Atom's feed id
+    key: str = 'all'
+
+COMBINED_FEED = FeedMeta(
+    'Steam Game News',
+    'http://store.steampowered.com/news/?feed=mygames',
+    'All of your Steam games\' news, combined!',
+)
+
+# Feed paging and archives (RFC 5005), see https://www.rfc-editor.org/rfc/rfc5005
+ATOM_NAMESPACE = 'http://www.w3.org/2005/Atom'
+FH_NAMESPACE = 'http://purl.org/syndication/history/1.0'
+
+class PagedRSS2(rss.RSS2):
+    """RSS2 with RFC 5005 paging links as atom:link elements. Linking to `current` makes it an archive page."""
+    rss_attrs = {'version': '2.0', 'xmlns:atom': ATOM_NAMESPACE, 'xmlns:fh': FH_NAMESPACE}
+
+    def __init__(self, *args, links: dict[str, str], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.links = links
+
+    def publish_extensions(self, handler):
+        for rel, href in self.links.items():
+            handler.startElement('atom:link', {'rel': rel, 'href': href})
+            handler.endElement('atom:link')
+        if 'current' in self.links:
+            handler.startElement('fh:archive', {})
+            handler.endElement('fh:archive')
+
+def gen_rss_feed(rssitems: list[rss.RSSItem], meta: FeedMeta = COMBINED_FEED, links: dict[str, str] = {}):
     pdate = datetime.now(timezone.utc)
-    lbdate = max(cast(datetime, x.pubDate) for x in rssitems)
-    return rss.RSS2(
-        title='Steam Game News',
-        link='http://store.steampowered.com/news/?feed=mygames',
-        description='All of your Steam games\' news, combined!',
+    lbdate = max((cast(datetime, x.pubDate) for x in rssitems), default=pdate)
+    return (partial(PagedRSS2, links=links) if links else rss.RSS2)(
+        title=meta.title,
+        link=meta.link,
+        description=meta.description,
         pubDate=pdate,
         lastBuildDate=lbdate,
         items=rssitems,
@@ -39,49 +80,114 @@ def gen_rss_feed(rssitems: list[rss.RSSItem]):
 FEEDTYPE_HTML = 0
 FEEDTYPE_BBCODE = 1
 
-def news_item_to_rss_item(newsitem: NewsItem, db: NewsDatabase):
-    if newsitem['feed_type'] == FEEDTYPE_BBCODE:
-        content = convertBBCodeToHTML(newsitem['contents'])
+# GetNewsForApp doesn't say what kind of post an item is, the way the store's event calendar does.
+# Guess Steam's event_type from the item's tags, then its title, so EventTypes can bucket them.
+TAG_EVENT_TYPES = {
+    'patchnotes': 12,
+}
+TITLE_EVENT_TYPES = [
+    (re.compile(r'\b(sale|discount|free weekend)\b|\d+% off', re.IGNORECASE), 20),
+    (re.compile(r'\b(live ?stream|streaming)\b', re.IGNORECASE), 11),
+    (re.compile(r'\b(out now|release date|launch(es|ed)?|early access)\b', re.IGNORECASE), 10),
+    (re.compile(r'\b(patch|hotfix|update)\b', re.IGNORECASE), 12),
+]
+NEWS_EVENT_TYPE = 28
+
+def guess_category(tags: Iterable[str], title: str) -> EventTypes:
+    event_type = next((TAG_EVENT_TYPES[t] for t in tags if t in TAG_EVENT_TYPES), None)
+    if event_type is None:
+        event_type = next((et for pattern, et in TITLE_EVENT_TYPES if pattern.search(title)), NEWS_EVENT_TYPE)
+    return EventTypes.type_from_int(event_type) or EventTypes.news
+
+@dataclass(slots=True)
+class RenderedItem:
+    """A news item rendered for publishing; rendered once and shared by every feed it goes in"""
+    gid: str
+    title: str
+    link: Optional[str]
+    html: str
+    author: Optional[str]
+    pub_date: datetime
+    source: str
+    games: list[Game]
+    feedname: Optional[str]
+    category: EventTypes
+    _serialized: dict[str, str] = field(default_factory=dict)
+
+    def rss_item(self):
+        return rss.RSSItem(
+            title=self.title,
+            link=self.link,
+            description=self.html,
+            author=self.author,
+            guid=rss.Guid(self.gid, isPermaLink=False),
+            pubDate=self.pub_date,
+            categories=[
+                self.source
+            ],
+            source=rss.Source(self.games[0].name, f'https://store.steampowered.com/app/{self.games[0].appid}/') if len(self.games) == 1 else None
+        )
+
+    def serialized(self, format: str):
+        """The item in the given feed format, serialized once and reused by every feed it's in"""
+        if (out := self._serialized.get(format)) is None:
+            out = self._serialized[format] = FEED_FORMATS[format].serialize_item(self)
+        return out
+
+def news_item_to_rss_item(newsitem: NewsRow, db: NewsDatabase):
+    return render_news_item(newsitem, db).rss_item()
+
+def render_news_item(newsitem: NewsRow, db: NewsDatabase, tags: Iterable[str] = (), games: Optional[list[Game]] = None):
+    """Render a news item. games are the ones it was fetched for, from get_news_sources;
+    if not given, they're looked up for just this item."""
+    with metrics.RENDER_ITEM_SECONDS.time():
+        return _render_news_item(newsitem, db, tags, games)
+
+def _render_news_item(newsitem: NewsRow, db: NewsDatabase, tags: Iterable[str], games: Optional[list[Game]]):
+    if newsitem.feed_type == FEEDTYPE_BBCODE:
+        content = convertBBCodeToHTML(newsitem.contents or '')
     else:
-        content = newsitem['contents']
+        content = newsitem.contents or ''
 
     #Add the title of the game to the article title,
     #  but only if not present according to 'in' or difflib.get_close_matches.
     #get_close_matches isn't great for longer titles given the split() but /shrug
     #There are other libraries for fuzzy matching but difflib is built in...
-    games = db.get_source_names_and_appids_for_item(newsitem['gid']) or [Game('Unknown?', 0)]
-    rsstitle = newsitem['title']
+    if games is None:
+        games = db.get_source_names_and_appids_for_item(newsitem.gid)
+    games = games or [Game('Unknown?', 0)]
+    rsstitle = newsitem.title
     if len(games) > 1:
         rsstitle = f'[Multiple] {rsstitle}'
     elif games[0].name not in rsstitle:
         rsstitle = f'[{games[0].name}] {rsstitle}'
     #else game title is in article title, do nothing
 
-    source = newsitem['feedlabel']
+    source = newsitem.feedlabel
     if not source:
         #patch over missing feedname in Steam News;
         # seems to be the only news source w/o feedlabels?
-        if newsitem['feedname'] == 'steam_community_blog':
+        if newsitem.feedname == 'steam_community_blog':
             source = 'Steam Community Blog'
         else:
             #shrug.
-            source = newsitem['feedname'] or 'Unknown Source'
+            source = newsitem.feedname or 'Unknown Source'
 
     sources = f'''<p><i>Via <b>{source}</b> for {
         ', '.join(f'<a href="https://store.steampowered.com/app/{game.appid}/">{game.name}</a>' for game in games)
     }</i></p>\n'''
 
-    return rss.RSSItem(
+    return RenderedItem(
+        gid=newsitem.gid,
         title=rsstitle,
-        link=newsitem['url'],
-        description=sources + content,
-        author=newsitem['author'],
-        guid=rss.Guid(newsitem['gid'], isPermaLink=False),
-        pubDate=datetime.fromtimestamp(newsitem['date'], timezone.utc),
-        categories=[
-            source
-        ],
-        source=rss.Source(games[0].name, f'https://store.steampowered.com/app/{games[0].appid}/') if len(games) == 1 else None
+        link=newsitem.url,
+        html=sources + content,
+        author=newsitem.author,
+        pub_date=datetime.fromtimestamp(newsitem.date, timezone.utc),
+        source=source,
+        games=games,
+        feedname=newsitem.feedname,
+        category=guess_category(tags, newsitem.title),
     )
 
 # RE: BBCode http://bbcode.readthedocs.org/
@@ -175,21 +281,363 @@ def render_yt(tag_name: str, value: str, options: dict[str, str], parent, contex
         # TODO uhh... look at https://dcwatson.github.io/bbcode/formatters/ again
         return ''
 
-def publish(db: NewsDatabase, output_path=None):
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>'
+STYLESHEET_PI = '<?xml-stylesheet href="{}" type="text/xsl"?>'
+
+def rss_item_xml(item: RenderedItem):
+    out = io.StringIO()
+    item.rss_item().publish(XMLGenerator(out, 'utf-8'))
+    return out.getvalue()
+
+def rss_document(meta: FeedMeta, items: list[RenderedItem], stylesheet: Optional[str] = 'style.xsl', links: dict[str, str] = {}):
+    """The whole RSS document for a feed, stitched together from each item's pre-serialized XML"""
+    channel = gen_rss_feed([], meta, links)
+    #dated by the newest item rather than now, so the same items always make the same document
+    channel.pubDate = channel.lastBuildDate = max((x.pub_date for x in items), default=channel.pubDate)
+    head, tail = channel.to_xml(encoding='utf-8').removeprefix(XML_DECLARATION).rsplit('</channel>', 1)
+    prolog = XML_DECLARATION + ('\n' + STYLESHEET_PI.format(stylesheet) if stylesheet else '')
+    return ''.join((prolog, head, *(x.serialized('rss') for x in items), '</channel>', tail))
+
+# Atom, see https://www.rfc-editor.org/rfc/rfc4287
+
+def atom_id(key: str):
+    return f'tag:steam-news,2024:{key}'
+
+def atom_entry_xml(item: RenderedItem):
+    parts = [
+        '<entry>',
+        f'<id>{atom_id("news/" + escape(item.gid))}</id>',
+        f'<title>{escape(item.title)}</title>',
+        f'<updated>{item.pub_date.isoformat()}</updated>',
+        f'<published>{item.pub_date.isoformat()}</published>',
+    ]
+    if item.link:
+        parts.append(f'<link rel="alternate" href={quoteattr(item.link)}/>')
+    if item.author:
+        parts.append(f'<author><name>{escape(item.author)}</name></author>')
+    parts.append(f'<category term={quoteattr(item.source)}/>')
+    parts.append(f'<category term={quoteattr(item.category.name)}/>')
+    parts.append(f'<content type="html">{escape(item.html)}</content>')
+    parts.append('</entry>')
+    return ''.join(parts)
+
+def atom_document(meta: FeedMeta, items: list[RenderedItem], stylesheet: Optional[str] = None, links: dict[str, str] = {}):
+    # style.xsl only knows RSS, so Atom feeds never get it
+    updated = max((x.pub_date for x in items), default=datetime.now(timezone.utc))
+    return ''.join((
+        XML_DECLARATION,
+        f'\n<feed xmlns="{ATOM_NAMESPACE}" xmlns:fh="{FH_NAMESPACE}">' if links else f'\n<feed xmlns="{ATOM_NAMESPACE}">',
+        f'<id>{atom_id(escape(meta.key))}</id>',
+        f'<title>{escape(meta.title)}</title>',
+        f'<subtitle>{escape(meta.description)}</subtitle>',
+        f'<link rel="alternate" href={quoteattr(meta.link)}/>',
+        *(f'<link rel={quoteattr(rel)} href={quoteattr(href)}/>' for rel, href in links.items()),
+        '<fh:archive/>' if 'current' in links else '',
+        f'<updated>{updated.isoformat()}</updated>',
+        # Atom wants an author on every entry; entries without one fall back to this
+        '<author><name>Steam</name></author>',
+        '<generator>steam-news</generator>',
+        *(x.serialized('atom') for x in items),
+        '</feed>\n',
+    ))
+
+# JSON Feed, see https://www.jsonfeed.org/version/1.1/
+
+def json_feed_item(item: RenderedItem):
+    out: dict[str, object] = {
+        'id': item.gid,
+        'title': item.title,
+        'content_html': item.html,
+        'date_published': item.pub_date.isoformat(),
+        'tags': [item.source, item.category.name],
+    }
+    if item.link:
+        out['url'] = item.link
+    if item.author:
+        out['authors'] = [{'name': item.author}]
+    return json.dumps(out, ensure_ascii=False)
+
+def json_feed_document(meta: FeedMeta, items: list[RenderedItem], stylesheet: Optional[str] = None, links: dict[str, str] = {}):
+    head: dict[str, object] = {
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': meta.title,
+        'home_page_url': meta.link,
+        'description': meta.description,
+    }
+    #JSON Feed's own paging: next_url leads to older items, and an expired feed won't change again
+    if 'prev-archive' in links:
+        head['next_url'] = links['prev-archive']
+    if 'current' in links:
+        head['expired'] = True
+    head['items'] = []
+    head = json.dumps(head, ensure_ascii=False)
+    #items is the last key, so splice the pre-serialized items into its empty list
+    return head.removesuffix('[]}') + '[' + ','.join(x.serialized('json') for x in items) + ']}\n'
+
+class FeedFormat(NamedTuple):
+    extension: str
+    serialize_item: Callable[[RenderedItem], str]
+    document: Callable[[FeedMeta, list[RenderedItem], Optional[str], dict[str, str]], str]
+
+FEED_FORMATS = {
+    'rss': FeedFormat('.xml', rss_item_xml, rss_document),
+    'atom': FeedFormat('.atom', atom_entry_xml, atom_document),
+    'json': FeedFormat('.json', json_feed_item, json_feed_document),
+}
+
+def format_for_path(path: str):
+    """Guess the feed format from a file name, defaulting to RSS"""
+    ext = os.path.splitext(path)[1].lower()
+    return next((name for name, f in FEED_FORMATS.items() if f.extension == ext), 'rss')
+
+def format_paths(path: str, formats: Collection[str]):
+    """Where to write each format of the feed at path: path itself for its own format, siblings with the other extensions"""
+    base, _ = os.path.splitext(path)
+    own = format_for_path(path)
+    return {fmt: path if fmt == own else base + FEED_FORMATS[fmt].extension for fmt in formats}
+
+def feed_documents(path: str, meta: FeedMeta, items: list[RenderedItem], formats: Collection[str], stylesheet: str = 'style.xsl',
+        links: dict[str, dict[str, str]] = {}):
+    """The feed in each format, as (path, document); `links` are the paging links for each format, if any"""
+    for fmt, fmt_path in format_paths(path, formats).items():
+        yield fmt_path, FEED_FORMATS[fmt].document(meta, items, stylesheet, links.get(fmt, {}))
+
+def write_feed(path: str, meta: FeedMeta, items: list[RenderedItem], formats: Collection[str], stylesheet: str = 'style.xsl',
+        links: dict[str, dict[str, str]] = {}):
+    """Write the feed in each format. Returns the paths written."""
+    paths: list[str] = []
+    for fmt_path, document in feed_documents(path, meta, items, formats, stylesheet, links):
+        with open(fmt_path, 'w', encoding='utf-8') as f:
+            f.write(document)
+        paths.append(fmt_path)
+    return paths
+
+class FeedLimits(NamedTuple):
+    """Caps on the combined feed; whatever doesn't fit is moved to archive pages"""
+    max_items: Optional[int] = None
+    # Measured on the items as serialized in the first format being written
+    max_bytes: Optional[int] = None
+
+    def __bool__(self):
+        return bool(self.max_items or self.max_bytes)
+
+    def over(self, count: int, size: int):
+        return bool(self.max_items and count > self.max_items or self.max_bytes and size > self.max_bytes)
+
+    def page_full(self, count: int, size: int):
+        #pages are half the limit, so the next few publishes don't each archive a page of one or two items
+        return bool(self.max_items and count >= max(1, self.max_items // 2) or self.max_bytes and size >= self.max_bytes // 2)
+
+ARCHIVE_DIR = 'archive'
+ARCHIVE_INDEX = 'index.json'
+
+class ArchivePage(NamedTuple):
+    name: str
+    gids: list[str]
+
+def load_archive_index(path: str) -> list[ArchivePage]:
+    """Archive pages written so far that still have items in the window (plus the newest), oldest first"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return [ArchivePage(page['name'], page['gids']) for page in json.load(f)['pages']]
+    except FileNotFoundError:
+        return []
+
+def save_archive_index(path: str, pages: list[ArchivePage]):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'pages': [page._asdict() for page in pages]}, f)
+    os.replace(tmp, path)
+
+def archive_page_name(prev: Optional[str], gids: list[str]):
+    """Archive pages are named for what's in them, including the page before, so a name never changes meaning"""
+    return hashlib.sha256(json.dumps([prev, gids]).encode()).hexdigest()[:16]
+
+def split_archive_pages(head: list[RenderedItem], limits: FeedLimits, fmt: str):
+    """Take pages of the oldest items off the end of head (newest first) until the rest fits in limits.
+    Returns the new pages oldest first, each newest first like a feed."""
+    sizes = [len(x.serialized(fmt).encode()) for x in head] if limits.max_bytes else [0] * len(head)
+    size = sum(sizes)
+    pages: list[list[RenderedItem]] = []
+    while head and limits.over(len(head), size):
+        page: list[RenderedItem] = []
+        page_size = 0
+        while head and not (page and limits.page_full(len(page), page_size)):
+            page.append(head.pop())
+            page_size += sizes.pop()
+        size -= page_size
+        page.reverse()
+        pages.append(page)
+    return pages
+
+def archive_old_items(output_path: str, items: list[RenderedItem], formats: list[str], limits: FeedLimits):
+    """Move whatever doesn't fit in limits into immutable archive pages next to output_path.
+    Returns the items left for the head feed, its paging links for each format, and the archive files written."""
+    out_dir = os.path.dirname(output_path)
+    archive_dir = os.path.join(out_dir, ARCHIVE_DIR)
+    index_path = os.path.join(archive_dir, ARCHIVE_INDEX)
+    pages = load_archive_index(index_path)
+    #only gids still in the window could turn up again, so the index forgets the rest
+    # (keeping the newest page's name, which the next page links back to)
+    live = {x.gid for x in items}
+    kept = [ArchivePage(page.name, [gid for gid in page.gids if gid in live]) for page in pages]
+    kept = [page for i, page in enumerate(kept) if page.gids or i == len(kept) - 1]
+    pruned = kept != pages
+    pages = kept
+    archived = {gid for page in pages for gid in page.gids}
+    head = [x for x in items if x.gid not in archived]
+    head_paths = format_paths(output_path, formats)
+
+    new_pages = split_archive_pages(head, limits, formats[0])
+    written: list[str] = []
+    if new_pages:
+        logger.info('Archiving %d items into %d pages...', sum(len(page) for page in new_pages), len(new_pages))
+        os.makedirs(archive_dir, exist_ok=True)
+    for page_items in new_pages:
+        prev = pages[-1].name if pages else None
+        gids = [x.gid for x in page_items]
+        name = archive_page_name(prev, gids)
+        links = {}
+        for fmt in formats:
+            ext = FEED_FORMATS[fmt].extension
+            links[fmt] = {'current': os.path.relpath(head_paths[fmt], archive_dir).replace(os.sep, '/')}
+            if prev and os.path.exists(os.path.join(archive_dir, prev + ext)):
+                links[fmt]['prev-archive'] = prev + ext
+        written += write_feed(os.path.join(archive_dir, name + FEED_FORMATS[formats[0]].extension),
+            COMBINED_FEED, page_items, formats, '../style.xsl', links)
+        pages.append(ArchivePage(name, gids))
+    if new_pages or pruned:
+        #only once the pages exist, so the index never points at a page that wasn't written
+        save_archive_index(index_path, pages)
+
+    head_links: dict[str, dict[str, str]] = {}
+    if pages:
+        for fmt in formats:
+            #pages from before a format was added don't have it
+            page_file = pages[-1].name + FEED_FORMATS[fmt].extension
+            if os.path.exists(os.path.join(archive_dir, page_file)):
+                head_links[fmt] = {'prev-archive': f'{ARCHIVE_DIR}/{page_file}'}
+    return head, head_links, written
+
+# Extra feeds publish can split the news into, besides the combined one
+FEED_KINDS = ('app', 'feed', 'category', 'user')
+
+def feed_keys(item: RenderedItem, kinds: Collection[str], users_by_app: dict[int, list[str]] = {}, own: bool = True):
+    """The split feeds an item goes in. Only user feeds get items that aren't in the combined feed (own=False)."""
+    if not own:
+        kinds = [kind for kind in kinds if kind == 'user']
+    if 'app' in kinds:
+        for game in item.games:
+            if game.appid:
+                yield 'app', str(game.appid)
+    if 'feed' in kinds and item.feedname:
+        yield 'feed', item.feedname
+    if 'category' in kinds:
+        yield 'category', item.category.name
+    if 'user' in kinds:
+        #everyone fetching any of the item's games, once each
+        for user in dict.fromkeys(user for game in item.games for user in users_by_app.get(game.appid, ())):
+            yield 'user', user
+
+def feed_meta(kind: str, key: str, item: RenderedItem):
+    if kind == 'app':
+        name = next((g.name for g in item.games if str(g.appid) == key), key)
+        return FeedMeta(f'{name} News', f'https://store.steampowered.com/news/app/{key}', f'Steam news for {name}', f'{kind}/{key}')
+    if kind == 'user':
+        return FeedMeta(f'Steam Game News for {key}', COMBINED_FEED.link, f'All of {key}\'s Steam games\' news, combined!', f'{kind}/{key}')
+    if kind == 'feed':
+        return FeedMeta(f'Steam Game News: {item.source}', COMBINED_FEED.link, f'All of your Steam games\' news from {item.source}', f'{kind}/{key}')
+    return FeedMeta(f'Steam Game News: {key.title()}', COMBINED_FEED.link, f'All of your Steam games\' {key}', f'{kind}/{key}')
+
+def feed_path(out_dir: str, kind: str, key: str):
+    return os.path.join(out_dir, kind, re.sub(r'[^\w.-]', '_', key) + '.xml')
+
+class RoutedFeed(NamedTuple):
+    meta: FeedMeta
+    items: list[RenderedItem]
+
+def check_feed_options(output_path: str, feeds: Collection[str], formats: Collection[str]):
+    """Validate the feed kinds and formats asked for. Returns the formats to write, defaulting to output_path's."""
+    if unknown := set(feeds) - set(FEED_KINDS):
+        raise ValueError(f'Unknown feed kind(s): {", ".join(sorted(unknown))}; expected {", ".join(FEED_KINDS)}')
+    formats = list(dict.fromkeys(formats)) or [format_for_path(output_path)]
+    if unknown := set(formats) - set(FEED_FORMATS):
+        raise ValueError(f'Unknown feed format(s): {", ".join(sorted(unknown))}; expected {", ".join(FEED_FORMATS)}')
+    return formats
+
+def render_feeds(db: NewsDatabase, feeds: Collection[str] = ()):
+    """Scan the news once, rendering each item, and route the items into the `feeds` kinds asked for.
+    Returns the combined feed's items, newest first, and the split feeds by (kind, key).
+    The combined feed (and the app/feed/category ones split from it) only has news for the DB's own games;
+    news for games only users fetch just goes in their user feeds."""
+    #everything from the DB up front, so the db phase covers all of it (get_news_rows is a lazy cursor)
+    with profiling.phase('db'):
+        tags = db.get_news_tags()
+        sources = db.get_news_sources()
+        own_appids = db.get_own_fetch_appids()
+        users_by_app = db.get_user_fetch_apps() if 'user' in feeds else {}
+        rows = list(db.get_news_rows())
+
+    items: list[RenderedItem] = []
+    routed: dict[tuple[str, str], RoutedFeed] = {}
+    with profiling.phase('render'):
+        for row in rows:
+            games = sources.get(row.gid, [])
+            #items that lost their sources still go in, as before
+            own = not games or any(game.appid in own_appids for game in games)
+            if not own and not any(game.appid in users_by_app for game in games):
+                continue
+            item = render_news_item(row, db, tags.get(row.gid, ()), games)
+            if own:
+                items.append(item)
+            for key in feed_keys(item, feeds, users_by_app, own):
+                if key not in routed:
+                    routed[key] = RoutedFeed(feed_meta(*key, item), [])
+                routed[key].items.append(item)
+    return items, routed
+
+def publish(db: NewsDatabase, output_path=None, feeds: Collection[str] = (), formats: Collection[str] = (),
+        limits: FeedLimits = FeedLimits(), compress: bool = False, html_dir: Optional[str] = None):
+    """Write the combined feed to output_path. `feeds` can also ask for any of FEED_KINDS,
+    which get written to folders of that name next to it. `formats` picks from FEED_FORMATS,
+    defaulting to whichever one output_path's extension says; every format is written side by side.
+    With `limits`, the combined feed only keeps the newest items and links to archive pages for the rest.
+    With `html_dir`, a static HTML version of the news is written there too.
+    With `compress`, everything written also gets precompressed .gz/.br copies.
+    The news is scanned and each item rendered just once, however many feeds it ends up in."""
     if not output_path:
         output_path = 'steam_news.xml'
+    formats = check_feed_options(output_path, feeds, formats)
+
+    start = time.perf_counter()
+    logger.info('Generating %s feed...', '/'.join(formats))
+    items, routed = render_feeds(db, feeds)
+
+    head, head_links, written = archive_old_items(output_path, items, formats, limits) if limits else (items, {}, [])
 
-    logger.info('Generating RSS feed...')
-    rssitems = [news_item_to_rss_item(row, db) for row in db.get_news_rows()]
-    feed = gen_rss_feed(rssitems)
     logger.info('Writing to %s...', output_path)
-    with open(output_path, 'w') as f:
-        xml_str = feed.to_xml(encoding='utf-8')
-        xml_str = xml_str.replace('<?xml version="1.0" encoding="utf-8"?>', '<?xml version="1.0" encoding="utf-8"?>\n<?xml-stylesheet href="style.xsl" type="text/xsl"?>')
-        f.write(xml_str)
+    written += write_feed(output_path, COMBINED_FEED, head, formats, links=head_links)
+
+    out_dir = os.path.dirname(output_path)
+    if routed:
+        logger.info('Writing %d more feeds...', len(routed))
+        for kind in {kind for kind, _ in routed}:
+            os.makedirs(os.path.join(out_dir, kind), exist_ok=True)
+        for (kind, key), feed in routed.items():
+            written += write_feed(feed_path(out_dir, kind, key), feed.meta, feed.items, formats, '../style.xsl')
+
+    written.append(shutil.copyfile('style.xsl', os.path.join(out_dir, 'style.xsl')))
+
+    if html_dir:
+        from html_site import write_site
+        written += write_site(html_dir, items)
 
-    shutil.copyfile('style.xsl', os.path.join(os.path.dirname(output_path), 'style.xsl'))
+    if compress:
+        from precompress import precompress
+        precompress(out_dir, written)
 
+    metrics.PUBLISH_SECONDS.set(time.perf_counter() - start)
+    metrics.PUBLISH_ITEMS.set(len(items))
     logger.info('Published!')
 
 if __name__ == '__main__':
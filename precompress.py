@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, Iterable
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Precompressed copies of published files (feed.xml -> feed.xml.gz, feed.xml.br) for static hosts
+# that can serve them as-is (nginx gzip_static/brotli_static, Caddy's precompressed, ...)
+# instead of compressing on every request.
+# A manifest of content hashes means unchanged files don't get recompressed every publish.
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = '.precompressed.json'
+
+ENCODINGS: dict[str, Callable[[bytes], bytes]] = {
+    # mtime=0 so the same input always gives the same .gz
+    '.gz': lambda data: gzip.compress(data, compresslevel=9, mtime=0),
+}
+if brotli:
+    ENCODINGS['.br'] = lambda data: brotli.compress(data, quality=11)
+
+def load_manifest(path: str) -> dict[str, str]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def write_atomic(path: str, data: bytes):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def precompress(out_dir: str, paths: Iterable[str]):
+    """Write compressed siblings of each file, unless they're already there for the same content.
+    Returns how many files were (re)compressed."""
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    manifest = load_manifest(manifest_path)
+    compressed = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        key = os.path.relpath(path, out_dir or os.curdir).replace(os.sep, '/')
+        if manifest.get(key) == digest and all(os.path.exists(path + ext) for ext in ENCODINGS):
+            continue
+        for ext, compress in ENCODINGS.items():
+            write_atomic(path + ext, compress(data))
+        manifest[key] = digest
+        compressed += 1
+
+    if compressed:
+        write_atomic(manifest_path, json.dumps(manifest, indent=1, sort_keys=True).encode())
+    logger.info('Precompressed %d changed files (%s)', compressed, ', '.join(ENCODINGS))
+    return compressed
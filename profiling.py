@@ -0,0 +1,154 @@
+import logging
+import os
+import signal
+from collections import Counter
+from contextlib import contextmanager
+from types import FrameType
+from typing import TYPE_CHECKING, Iterable, Optional
+
+if TYPE_CHECKING:
+    import cProfile
+
+# Opt-in profiling around the phases of a run, see --profile.
+# Phases can nest (e.g. db inside fetch); time goes to the innermost profiled phase.
+# cprofile mode writes <phase>.pstats plus a <phase>.collapsed file built from pstats' caller->callee edges
+# (so only two frames deep). sampling mode takes wall-clock stack samples of the main thread off a
+# SIGALRM interval timer (so Unix only) and writes full-depth <phase>.collapsed files;
+# both can be fed to flamegraph.pl or speedscope.
+# Sampling from a second thread instead would only ever get the GIL while sqlite/sockets
+# had released it, which skews every sample toward I/O.
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('seed', 'fetch', 'publish', 'render', 'db')
+MODES = ('cprofile', 'sampling')
+
+def frame_label(filename: str, lineno: int, funcname: str):
+    return f'{funcname} ({os.path.basename(filename)}:{lineno})'
+
+class Profiler:
+    def __init__(self):
+        self.phases = frozenset[str]()
+        self.mode = 'cprofile'
+        self.out_dir = 'profiles'
+        self.top = 15
+        self.interval = 0.005
+        self._stack: list[str] = []
+        self._profiles: dict[str, 'cProfile.Profile'] = {}
+        self._samples: dict[str, Counter[tuple[str, ...]]] = {}
+
+    @property
+    def enabled(self):
+        return bool(self.phases)
+
+    def configure(self, phases: Iterable[str], mode: str = 'cprofile', out_dir: str = 'profiles', top: int = 15):
+        """Enable profiling for the given phases (all of them if empty)."""
+        phases = frozenset(phases) or frozenset(PHASES)
+        if unknown := phases - set(PHASES):
+            raise ValueError(f'Unknown profile phase(s): {", ".join(sorted(unknown))}; expected {", ".join(PHASES)}')
+        if mode not in MODES:
+            raise ValueError(f'Unknown profile mode: {mode}')
+        self.phases = phases
+        self.mode = mode
+        self.out_dir = out_dir
+        self.top = top
+        if mode == 'sampling':
+            signal.signal(signal.SIGALRM, self._sample)
+            signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        logger.info('Profiling phases %s (%s), output to %s', ', '.join(sorted(self.phases)), mode, out_dir)
+
+    @contextmanager
+    def phase(self, name: str):
+        if name not in self.phases:
+            yield
+            return
+
+        outer = self._stack[-1] if self._stack else None
+        if self.mode == 'cprofile':
+            import cProfile
+            if outer:
+                self._profiles[outer].disable()
+            self._profiles.setdefault(name, cProfile.Profile()).enable()
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            if self.mode == 'cprofile':
+                self._profiles[name].disable()
+                if outer:
+                    self._profiles[outer].enable()
+
+    def _sample(self, signum: int, frame: Optional[FrameType]):
+        if not self._stack:
+            return
+        stack: list[str] = []
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename != __file__:
+                stack.append(frame_label(code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        stack.reverse()
+        self._samples.setdefault(self._stack[-1], Counter())[tuple(stack)] += 1
+
+    def finish(self):
+        """Stop profiling and write out everything collected."""
+        if not self.enabled:
+            return
+        if self.mode == 'sampling':
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        os.makedirs(self.out_dir, exist_ok=True)
+        if self.mode == 'cprofile':
+            for name, prof in self._profiles.items():
+                self._write_cprofile(name, prof)
+        else:
+            for name, samples in self._samples.items():
+                self._write_samples(name, samples)
+
+    def _write_cprofile(self, name: str, prof: 'cProfile.Profile'):
+        import pstats
+        pstats_path = os.path.join(self.out_dir, f'{name}.pstats')
+        prof.dump_stats(pstats_path)
+        stats = pstats.Stats(prof)
+        raw = stats.stats # type: ignore[attr-defined]
+
+        with open(os.path.join(self.out_dir, f'{name}.collapsed'), 'w') as f:
+            for func, (_, _, _, _, callers) in raw.items():
+                callee = frame_label(*func)
+                for caller, (_, _, tt, _) in callers.items():
+                    if (us := int(tt * 1e6)) > 0:
+                        f.write(f'{frame_label(*caller)};{callee} {us}\n')
+
+        total = stats.total_tt # type: ignore[attr-defined]
+        lines = [f'Profile for {name}: {total * 1000:.1f} ms in {stats.total_calls} calls; top {self.top} by own time:'] # type: ignore[attr-defined]
+        for func, (cc, nc, tt, ct, _) in sorted(raw.items(), key=lambda x: x[1][2], reverse=True)[:self.top]:
+            lines.append(f'  {tt * 1000:9.1f} ms own {ct * 1000:9.1f} ms total {nc:8d} calls  {frame_label(*func)}')
+        logger.info('\n'.join(lines))
+        logger.info('Wrote %s', pstats_path)
+
+    def _write_samples(self, name: str, samples: Counter[tuple[str, ...]]):
+        path = os.path.join(self.out_dir, f'{name}.collapsed')
+        with open(path, 'w') as f:
+            for stack, n in samples.most_common():
+                f.write(f'{";".join(stack)} {n}\n')
+
+        total = sum(samples.values())
+        own = Counter[str]()
+        inclusive = Counter[str]()
+        for stack, n in samples.items():
+            if stack:
+                own[stack[-1]] += n
+            for label in set(stack):
+                inclusive[label] += n
+        lines = [f'Profile for {name}: {total} samples (~{total * self.interval * 1000:.0f} ms); top {self.top} by own samples:']
+        for label, n in own.most_common(self.top):
+            lines.append(f'  {n / total:6.1%} own {inclusive[label] / total:6.1%} total  {label}')
+        logger.info('\n'.join(lines))
+        logger.info('Wrote %s', path)
+
+PROFILER = Profiler()
+
+def phase(name: str):
+    """Profile the enclosed block as the given phase, if that phase was asked for."""
+    return PROFILER.phase(name)
@@ -0,0 +1,101 @@
+import gzip
+import json
+import logging
+import os
+import zlib
+
+from database import NewsDatabase
+
+# Compact snapshots of a NewsDatabase's live data, for carrying it between CI runs (e.g. in a cache)
+# instead of the whole SQLite file.
+# A snapshot is a series of gzip members, each holding JSON lines: a header line, then one
+# [kind, key, value] record per line. The first member (or any member marked full) has every record;
+# later ones are deltas with only records that changed since, plus [kind, key, null] for ones that are gone.
+# Exporting to an existing snapshot appends a delta member, so a day's export is only as big as the day's news.
+# Once the deltas add up to more than the live data itself, the next export rewrites it as one full member.
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# Order records get loaded in, so rows come after whatever they refer to
+KINDS = ('game', 'user', 'expire', 'clan', 'usergame', 'item')
+
+def record_line(kind: str, key: str, value: object):
+    return json.dumps([kind, key, value], ensure_ascii=False, separators=(',', ':'))
+
+def header_line(full: bool):
+    return json.dumps(['snapshot', SNAPSHOT_VERSION, {'full': full}])
+
+def gzip_members(data: bytes):
+    """Split data into its gzip members, decompressed. The second value is whether it ended with
+    a truncated member (an export that was killed partway through appending), which gets left out."""
+    members: list[bytes] = []
+    while data:
+        d = zlib.decompressobj(wbits=31)
+        content = d.decompress(data)
+        if not d.eof:
+            logger.warning('Ignoring truncated delta at the end of the snapshot')
+            return members, True
+        members.append(content)
+        data = d.unused_data
+    return members, False
+
+def read_snapshot(path: str):
+    """Replay a snapshot's members. Returns the live records as {(kind, key): line}, and how many records
+    the file holds in total (to tell when it's worth compacting), or None if it needs rewriting
+    because it ends in a truncated delta."""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    state: dict[tuple[str, str], str] = {}
+    total = 0
+    members, truncated = gzip_members(data)
+    for member in members:
+        lines = member.decode('utf-8').splitlines()
+        header = json.loads(lines[0])
+        if header[:2] != ['snapshot', SNAPSHOT_VERSION]:
+            raise ValueError(f'{path} is not a version {SNAPSHOT_VERSION} snapshot')
+        if header[2].get('full'):
+            state.clear()
+        for line in lines[1:]:
+            kind, key, value = json.loads(line)
+            total += 1
+            if value is None:
+                state.pop((kind, key), None)
+            else:
+                state[(kind, key)] = line
+    return state, None if truncated else total
+
+def export_snapshot(db: NewsDatabase, path: str):
+    """Save the DB's live data to path: a delta appended to the snapshot already there, or a full one"""
+    current = {(kind, key): record_line(kind, key, value) for kind, key, value in db.get_snapshot_records()}
+    previous, total = read_snapshot(path) if os.path.exists(path) else ({}, 0)
+
+    #anything appended after a truncated member would be unreadable, so start over
+    if not previous or total is None or total > 2 * len(current):
+        content = '\n'.join([header_line(True), *current.values()]) + '\n'
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(gzip.compress(content.encode(), compresslevel=9, mtime=0))
+        os.replace(tmp, path)
+        logger.info('Wrote full snapshot of %d records to %s (%d bytes)', len(current), path, os.path.getsize(path))
+        return
+
+    changed = [line for k, line in current.items() if previous.get(k) != line]
+    removed = [record_line(kind, key, None) for kind, key in previous.keys() - current.keys()]
+    if not changed and not removed:
+        logger.info('Snapshot %s is already up to date', path)
+        return
+    member = gzip.compress(('\n'.join([header_line(False), *changed, *removed]) + '\n').encode(), compresslevel=9, mtime=0)
+    with open(path, 'ab') as f:
+        f.write(member)
+    logger.info('Appended %d changed and %d removed records to %s (%d bytes)', len(changed), len(removed), path, len(member))
+
+def import_snapshot(db: NewsDatabase, path: str):
+    """Load a snapshot's live data into the DB"""
+    state, _ = read_snapshot(path)
+    order = {kind: i for i, kind in enumerate(KINDS)}
+    db.load_snapshot_records(
+        (kind, json.loads(line)[2]) for (kind, _), line in sorted(state.items(), key=lambda x: order.get(x[0][0], len(KINDS)))
+    )
@@ -4,34 +4,34 @@
 # https://bendodson.com/weblog/2016/05/17/fetching-rss-feeds-for-steam-game-updates/
 # http://www.getoffmalawn.com/blog/rss-feeds-for-steam-games
 
-import argparse
 from datetime import datetime, timezone, timedelta
-from enum import Enum
-from http.client import HTTPResponse
-import json
 import logging
-from os import path
 import os
 import subprocess
 import sys
 import time
-from typing import Optional, TypedDict, cast
-import requests
-from urllib.error import HTTPError
-from xml.dom.minicompat import NodeList
-from xml.dom import minidom
-from xml.dom.minidom import Document, Element, Node, Text
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Iterable, Literal, Optional, TypedDict, cast
 import typed_argparse as tap
 
-load_dotenv()
+from steam_news_types import FetchedNews, News, NewsError, NewsItem, NewsRow
+from database import HighWaterMark, NewsDatabase
+import metrics
+import profiling
 
-from steam_news_types import News, NewsError, NewsItem
-from database import NewsDatabase
-from news_publisher import publish
+# requests, asyncio, dotenv, news_publisher (PyRSS2Gen, bbcode) and steam_unofficial_api (yarl)
+# are imported where they're used instead; together they're most of our startup time,
+# and plenty of runs (editing, everything cached) never touch some or all of them
+if TYPE_CHECKING:
+    import requests
 
 logger = logging.getLogger(__name__)
 
+STEAM_API_URL = 'https://api.steampowered.com'
+
+#be nice to Steam between fetches (seconds)
+FETCH_DELAY = 0.25
+FETCH_ERROR_DELAY = 1
+
 # Hardcoded list of AppIDs that return news related to Steam as a whole (not games)
 # Mileage may vary. Use app_id_discovery.py to maybe find more of these...
 STEAM_APPIDS = {
@@ -49,28 +49,35 @@ STEAM_APPIDS = {
 }
 
 
-def seed_database(id_or_vanity: str, db: NewsDatabase, minimum_playtime: Optional[int], last_6_months_only: bool):
+def seed_database(id_or_vanity: str, db: NewsDatabase, minimum_playtime: Optional[int], last_6_months_only: bool, user: Optional[str] = None):
+    """Add a Steam profile's games to the DB's own list, or to the given user's"""
     sid = int(id_or_vanity)
     # https://steamcommunity.com/dev/apikey
-    url = f'http://api.steampowered.com/IPlayerService/GetOwnedGames/v0001/?key={os.environ["STEAM_WEB_API_KEY"]}&steamid={sid}&format=json'
+    url = f'{STEAM_API_URL}/IPlayerService/GetOwnedGames/v0001/?key={os.environ["STEAM_WEB_API_KEY"]}&steamid={sid}&format=json'
 
     newsids, games_full = get_app_ids_from_url(url)
 
     #Also add the hardcoded ones...
     newsids.update(STEAM_APPIDS)
-    db.add_games(newsids)
+    if user is None:
+        db.add_games(newsids)
+    else:
+        #known to the DB, but only fetched because this user wants them
+        db.add_user(user, sid)
+        db.add_games(newsids, should_fetch=False)
+        db.add_user_games(user, newsids)
 
     # set should_fetch to whether last played <6mo ago and >minimum_playtime
     if last_6_months_only or minimum_playtime is not None:
         six_months_ago = (datetime.now(timezone.utc) - timedelta(days=6 * 30))
-        db.set_fetching_ids(
+        db.set_fetching_ids((
             (
                 appid,
                 ((not last_6_months_only or datetime.fromtimestamp(game['rtime_last_played'], timezone.utc) >= six_months_ago)
                     and (minimum_playtime is None or game['playtime_forever'] > minimum_playtime))
                     or appid in STEAM_APPIDS # add exception for steam_appids
             ) for appid, game in games_full.items()
-        )
+        ), user)
 
 applist: dict[int, str] | None = None
 
@@ -103,6 +110,20 @@ class GetOwnedGamesResult_Game(TypedDict):
     playtime_2_weeks: Optional[int]
 
 
+def http_get(url: str, endpoint: str):
+    """requests.get, recording latency and response size against the endpoint name"""
+    import requests
+    try:
+        with metrics.HTTP_REQUEST_SECONDS.time(endpoint=endpoint):
+            response = requests.get(url)
+    except requests.RequestException:
+        metrics.HTTP_ERRORS.inc(endpoint=endpoint)
+        raise
+    metrics.HTTP_RESPONSE_BYTES.inc(len(response.content), endpoint=endpoint)
+    if not response.ok:
+        metrics.HTTP_ERRORS.inc(endpoint=endpoint)
+    return response
+
 def get_app_ids_from_url(url: str):
     global applist
 
@@ -113,14 +134,14 @@ def get_app_ids_from_url(url: str):
 
     if applist is None:
         logger.info('Downloading steam app list...')
-        res = requests.get('https://api.steampowered.com/ISteamApps/GetAppList/v2/')
+        res = http_get(f'{STEAM_API_URL}/ISteamApps/GetAppList/v2/', 'GetAppList')
         res.raise_for_status()
         applist = dict[int, str]((x['appid'], x['name']) for x in cast(GetAppListResult, res.json())['applist']['apps'])
 
     games: dict[int, str] = {}
     games_full: dict[int, GetOwnedGamesResult_Game] = {}
 
-    res = requests.get(url)
+    res = http_get(url, 'GetOwnedGames')
     if res.ok:
         j: GetOwnedGamesResult = res.json()
 
@@ -137,7 +158,7 @@ def get_app_ids_from_url(url: str):
 
 # Date/time manipulation
 
-def get_expires_datetime_from_response(response: requests.Response):
+def get_expires_datetime_from_response(response: 'requests.Response'):
     def parse_expires_as_datetime(exp: str):
         # e.g. 'Sun, 15 Apr 2018 17:20:14 GMT'
         t = datetime.strptime(exp, '%a, %d %b %Y %H:%M:%S %Z')
@@ -152,79 +173,202 @@ def get_expires_datetime_from_response(response: requests.Response):
 # I shorthanded "news element dict" to distinguish it as a single item
 # vs. 'news' which is typically used for the entire JSON payload Steam gives us
 
-def get_news_for_appid(appid: int, filter_feed_names: str | None) -> News | NewsError:
-    """Get news for the given appid as a dict"""
-    url = f'https://api.steampowered.com/ISteamNews/GetNewsForApp/v0002/?format=json&maxlength=0&count=10&appid={appid}{filter_feed_names and f"&feeds={filter_feed_names}" or ""}'
+#GetNewsForApp returns the newest `count` items; this is how many we've always asked for
+NEWS_COUNT = 10
+#when we already have an app's news, first ask for just this many, in case nothing's new
+DELTA_COUNT = 3
+
+def get_news_for_appid(appid: int, filter_feed_names: str | None, count: int = NEWS_COUNT, enddate: int | None = None) -> FetchedNews | NewsError:
+    """Get news for the given appid"""
+    import requests
+    url = f'{STEAM_API_URL}/ISteamNews/GetNewsForApp/v0002/?format=json&maxlength=0&count={count}&appid={appid}{filter_feed_names and f"&feeds={filter_feed_names}" or ""}{enddate and f"&enddate={enddate}" or ""}'
     try:
-        response = requests.get(url)
+        response = http_get(url, 'GetNewsForApp')
         response.raise_for_status()
 
         # Get value of 'expires' header as a datetime obj
         exdt = get_expires_datetime_from_response(response)
-        # Parse the JSON
         news: News = response.json()
-        # Add the expire time to the group as a plain unix time
-        news['expires'] = int(exdt.timestamp())
-        # Decorate each news item and the group with its "true" appid
-        for newsitem in news['appnews']['newsitems']:
-            newsitem['realappid'] = appid
-
-        return news
-    except HTTPError as e:
-        return {'error': f'{e.code} {e.reason}'}
-
-def is_news_old(ned: NewsItem):
-    """Is this news item more than 30 days old?"""
-    newsdt = datetime.fromtimestamp(ned['date'], timezone.utc)
+        # Items get linked to the appid we asked for, their "true" appid
+        return FetchedNews(appid, int(exdt.timestamp()), news['appnews']['newsitems'])
+    except requests.HTTPError as e:
+        return {'error': f'{e.response.status_code} {e.response.reason}'}
+    except requests.RequestException as e:
+        return {'error': str(e)}
+
+def get_new_news_for_appid(appid: int, filter_feed_names: str | None, hwm: HighWaterMark | None) -> FetchedNews | NewsError:
+    """Like get_news_for_appid, but only returns items not already stored for this app.
+    Pages backwards from the newest item in small steps, stopping once it reaches the
+    app's high-water mark or the 30 day cutoff, so known items mostly aren't downloaded again."""
+    cutoff = int((datetime.now(timezone.utc) - timedelta(days=30)).timestamp())
+    count = DELTA_COUNT
+    if hwm is None:
+        #nothing stored in the window, which for most of a library means its newest news is older than that;
+        # ask for just the newest item first, and page back to the cutoff only if it's recent
+        hwm = HighWaterMark(cutoff, '', set())
+        count = 1
+
+    stop_at = max(hwm.date, cutoff)
+    first: FetchedNews | None = None
+    new_items: list[NewsItem] = []
+    seen = set[str]()
+    enddate = None
+    while True:
+        news = get_news_for_appid(appid, filter_feed_names, count, enddate)
+        if not isinstance(news, FetchedNews):
+            return news
+        if first is None:
+            first = news # keep the first response's expiry
+
+        page = news.items
+        unseen = [ned for ned in page if ned['gid'] not in seen]
+        seen.update(ned['gid'] for ned in unseen)
+        #newest first, so once we're down to the high-water mark the rest is already stored
+        caught_up = False
+        for ned in unseen:
+            if ned['gid'] == hwm.gid or ned['date'] < hwm.date:
+                caught_up = True
+                break
+            if ned['gid'] not in hwm.known_gids:
+                new_items.append(ned)
+
+        #stop if Steam ran out of items or repeated itself, or we've caught up
+        if caught_up or len(page) < count or not unseen or len(seen) >= NEWS_COUNT:
+            break
+        oldest = min(ned['date'] for ned in page)
+        if oldest <= stop_at:
+            break
+        #enddate may or may not be inclusive; dupes are skipped by the seen check
+        enddate = oldest
+        count = min(NEWS_COUNT - len(seen), count * 2)
+
+    return first._replace(items=new_items)
+
+def is_news_old(date: int):
+    """Is a news item from this unix time more than 30 days old?"""
+    newsdt = datetime.fromtimestamp(date, timezone.utc)
     thirtyago = datetime.now(timezone.utc) - timedelta(days=30)
     return newsdt < thirtyago
 
-def save_recent_news(news: News, db: NewsDatabase):
-    """Given a single news dict from getNewsForAppID,
-    save all "recent" news items to the DB"""
-    db.update_expire_time(news['appnews']['appid'], news['expires'])
-
-    current_entries = 0
-    for ned in news['appnews']['newsitems']:
-        if not is_news_old(ned):
-            db.insert_news_item(ned)
-            current_entries += 1
-    return current_entries
-
-def get_all_recent_news(newsids: dict[int, str], db: NewsDatabase, filter_feed_names: str | None):
-    """Given a dict of appids to names, store all "recent" items, respecting the cache"""
+def save_recent_news(news: FetchedNews, db: NewsDatabase, seen_gids: set[str], runid: Optional[int] = None):
+    """Given a single result from get_news_for_appid,
+    save all "recent" news items to the DB, in one transaction (along with the fetch run's journal, if given).
+    Items whose gid is in seen_gids are only linked to this app, not stored again;
+    newly stored gids get added to it."""
+    new_items: list[tuple[NewsRow, list[str]]] = []
+    linked: list[str] = []
+    new_gids = set[str]()
+    for ned in news.items:
+        if not is_news_old(ned['date']):
+            gid = ned['gid']
+            if gid in seen_gids or gid in new_gids:
+                #Steam-wide posts show up under lots of apps; no need to build a row just to link it
+                linked.append(gid)
+            else:
+                new_items.append((NewsRow.from_json(ned), ned.get('tags') or []))
+                new_gids.add(gid)
+
+    with metrics.DB_TRANSACTION_SECONDS.time(op='save_recent_news'), profiling.phase('db'):
+        db.save_fetched_news(news.appid, news.expires, new_items, linked, runid)
+
+    #only once it's committed
+    seen_gids.update(new_gids)
+    metrics.NEWS_ITEMS_SAVED.inc(len(new_items), kind='new')
+    metrics.NEWS_ITEMS_SAVED.inc(len(linked), kind='linked')
+    return len(new_items) + len(linked)
+
+def get_all_recent_news(newsids: dict[int, str], db: NewsDatabase, filter_feed_names: str | None, resume: bool = True):
+    """Given a dict of appids to names, store all "recent" items, respecting the cache.
+    Progress is journaled as it goes; if a previous run was killed partway (within the last hour or so),
+    this carries on from where it stopped (unless resume is False)."""
+    runid, done = db.begin_fetch_run(resume)
+    if done:
+        logger.info('Resuming fetch run %d: %d apps already done', runid, sum(1 for aid in newsids if aid in done))
+
+    high_water_marks = db.get_high_water_marks()
+    seen_gids = db.get_recent_gids()
+    cached = db.get_cached_appids()
     cache_hits = 0
     new_hits = 0
     fails = 0
+    skipped = 0
     idx = 0
     total_current = 0
     for aid, name in newsids.items():
         idx += 1
-        if db.is_news_cached(aid):
+        if aid in done:
+            skipped += 1
+            metrics.FETCH_APPS.inc(result='resumed')
+            continue
+
+        if aid in cached:
             logger.info('[%d/%d] Cache for %d: %s still valid!', idx, len(newsids), aid, name)
             cache_hits += 1
+            metrics.FETCH_APPS.inc(result='cached')
+            #not journaled: a resumed run checks the cache again anyway, and a commit per app would dwarf the check
             continue
 
-        news = get_news_for_appid(aid, filter_feed_names)
-        if 'appnews' in news: # success
-            cur_entries = save_recent_news(cast(News, news), db)
+        news = get_new_news_for_appid(aid, filter_feed_names, high_water_marks.get(aid))
+        if isinstance(news, FetchedNews): # success
+            cur_entries = save_recent_news(news, db, seen_gids, runid)
             new_hits += 1
+            metrics.FETCH_APPS.inc(result='fetched')
             if cur_entries:
-                logger.info('[%d/%d] Fetched %d: %s OK; %d current items', idx, len(newsids), aid, name, cur_entries)
+                logger.info('[%d/%d] Fetched %d: %s OK; %d new items', idx, len(newsids), aid, name, cur_entries)
                 total_current += cur_entries
             else:
-                logger.info('[%d/%d] Fetched %d: %s OK; nothing current', idx, len(newsids), aid, name)
-            time.sleep(0.25)
+                logger.info('[%d/%d] Fetched %d: %s OK; nothing new', idx, len(newsids), aid, name)
+            time.sleep(FETCH_DELAY)
         else:
             fails += 1
+            metrics.FETCH_APPS.inc(result='failed')
+            #not journaled either, so a resumed run tries it again
             logger.error('[%d/%d] %d: %s fetch error: %s', idx, len(newsids), aid, name, news['error'])
-            time.sleep(1)
-
-    logger.info('Run complete. %d cached, %d fetched, %d failed; %d current news items', cache_hits, new_hits, fails, total_current)
-
-def edit_fetch_games(name: str, db: NewsDatabase):
-    logger.info('Editing games like "%s"', name)
-    games = db.get_games_like(name)
+            time.sleep(FETCH_ERROR_DELAY)
+
+    db.finish_fetch_run(runid)
+    if newsids:
+        metrics.FETCH_CACHE_HIT_RATIO.set(cache_hits / len(newsids))
+    logger.info('Run complete. %d cached, %d fetched, %d failed, %d done by an earlier run; %d new news items',
+        cache_hits, new_hits, fails, skipped, total_current)
+
+def get_clan_ids_for_apps(appids: Iterable[int], db: NewsDatabase, concurrency: int = 8) -> dict[int, Optional[int]]:
+    """Map appids to their Steam clan ids (None if the app has no clan),
+    only asking Steam for the ones that aren't cached in the DB yet"""
+    import asyncio
+    from steam_unofficial_api import AsyncSteamUnofficialApi, NotSuccessError
+
+    appids = list(appids)
+    clanids = db.get_clan_ids(appids)
+    missing = [aid for aid in appids if aid not in clanids]
+    if not missing:
+        return clanids
+
+    logger.info('Looking up clan ids for %d apps...', len(missing))
+
+    async def lookup_all():
+        async with AsyncSteamUnofficialApi(max_concurrency=concurrency) as api:
+            async def lookup(appid: int):
+                try:
+                    data = await api.get_vanity_and_clan_id(appid)
+                    return appid, data['clanAccountID'], data['vanity_url']
+                except NotSuccessError:
+                    # the app just doesn't have a clan
+                    return appid, None, None
+                except Exception as e:
+                    #including a response that isn't JSON (requests' JSONDecodeError is a ValueError too); not cached
+                    logger.error('Clan id lookup for %d failed: %s', appid, e)
+                    return None
+            return await asyncio.gather(*(lookup(aid) for aid in missing))
+
+    found = [x for x in asyncio.run(lookup_all()) if x is not None]
+    db.save_clan_ids(found)
+    clanids.update((appid, clanid) for appid, clanid, _ in found)
+    return clanids
+
+def edit_fetch_games(name: str, db: NewsDatabase, user: Optional[str] = None):
+    logger.info('Editing games like "%s"%s', name, f' for {user}' if user else '')
+    games = db.get_games_like(name, user)
     before_on = set[int]()
     before_off = set[int]()
     args = [
@@ -259,25 +403,55 @@ def edit_fetch_games(name: str, db: NewsDatabase):
     logger.debug('Enabled %s\nDisabled: %s', enabled, disabled)
 
     if disabled:
-        db.disable_fetching_ids(disabled)
+        db.disable_fetching_ids(disabled, user)
         logger.info('Disabled %d games.', len(disabled))
     if enabled:
-        db.enable_fetching_ids(enabled)
+        db.enable_fetching_ids(enabled, user)
         logger.info('Enabled %d games.', len(enabled))
 
 class Args(tap.TypedArgs):
-    first_run: bool = tap.arg('--first-run')
+    first_run: bool = tap.arg('--first-run', help='no longer needed; the DB is set up (or upgraded) whenever it\'s opened')
     add_profile_games: Optional[str] = tap.arg('-a', '--add-profile-games', metavar='Steam ID|Vanity url')
     last_6_months_only: bool = tap.arg('--last-6-months-only', help='when using --add-profile-games, omit games not played in the last 6 months')
     minimum_playtime: Optional[int] = tap.arg('--minimum-playtime', help='when using --add-profile-games, minimum playtime to consider', metavar='minutes')
     fetch: bool = tap.arg('-f', '--fetch')
+    no_resume: bool = tap.arg('--no-resume', help='with --fetch, start over instead of carrying on from a fetch that was killed partway')
     publish: Optional[str] = tap.arg('-p', '--publish', metavar='XML output path')
     edit_games_like: Optional[str] = tap.arg('-g', '--edit-games-like', metavar='partial name of game')
+    user: Optional[str] = tap.arg('-u', '--user', metavar='name',
+        help='make --add-profile-games and --edit-games-like work on this user\'s games instead of the DB\'s own; see --feeds user')
     verbose: bool = tap.arg('-v', '--verbose')
     db_path: str = tap.arg('--db-path', default='SteamNews.db')
     filter_feed_names: Optional[str] = tap.arg('--filter-feed-names')
+    prune_older_than: Optional[int] = tap.arg('--prune-older-than', help='delete news items older than this', metavar='days')
+    metrics_file: Optional[str] = tap.arg('--metrics-file', help='write run metrics here at the end; JSON if it ends in .json, otherwise Prometheus textfile format', metavar='path')
+    profile: Optional[list[str]] = tap.arg('--profile', nargs='*', metavar='phase',
+        help=f'profile the given phases ({", ".join(profiling.PHASES)}), or all of them if none are given')
+    profile_mode: Literal['cprofile', 'sampling'] = tap.arg('--profile-mode', default='cprofile')
+    profile_dir: str = tap.arg('--profile-dir', default='profiles', help='where --profile writes .pstats/.collapsed files')
+    feeds: Optional[str] = tap.arg('--feeds', metavar='app,feed,category',
+        help='with --publish, also write a feed per game (app), per news source (feed), per kind of post (category) and/or per --user (user) in folders next to it')
+    formats: Optional[str] = tap.arg('--formats', metavar='rss,atom,json',
+        help='with --publish, the feed formats to write side by side (.xml, .atom, .json); by default, whichever the --publish path\'s extension says')
+    max_feed_items: Optional[int] = tap.arg('--max-feed-items',
+        help='with --publish, keep at most this many items in the feed and move older ones to archive pages (RFC 5005)')
+    max_feed_bytes: Optional[int] = tap.arg('--max-feed-bytes',
+        help='with --publish, keep the feed\'s items under this many bytes and move older ones to archive pages (RFC 5005)')
+    compress: bool = tap.arg('--compress', help='with --publish, also write .gz (and .br, if brotli is installed) copies of everything published')
+    html_dir: Optional[str] = tap.arg('--html-dir', metavar='path',
+        help='with --publish, also write a static HTML site (paginated index and a page per game) to this folder')
+    update_clans: bool = tap.arg('--update-clans', help='look up and cache clan ids for all games being fetched')
+    serve: Optional[str] = tap.arg('--serve', metavar='[HOST:]PORT',
+        help='serve the feed (named after --publish, with --feeds/--formats) over HTTP from memory, re-rendering when the DB changes')
+    snapshot_import: Optional[str] = tap.arg('--snapshot-import', metavar='path',
+        help='load games, users and recent news from a snapshot written by --snapshot-export before doing anything else')
+    snapshot_export: Optional[str] = tap.arg('--snapshot-export', metavar='path',
+        help='at the end, save games, users and recent news to a compact snapshot, appending just the changes if it already exists')
 
 def main(args: Args):
+    from dotenv import load_dotenv
+    load_dotenv()
+
     lvl = logging.DEBUG if args.verbose else logging.INFO
     logging.basicConfig(
         stream=sys.stdout,
@@ -285,23 +459,66 @@ def main(args: Args):
         level=lvl
     )
 
-    db_uninitialized = not path.exists(args.db_path)
-    with NewsDatabase(args.db_path) as db:
-        if args.first_run or db_uninitialized:
-            db.first_run()
-
-        if args.add_profile_games:
-            seed_database(args.add_profile_games, db, args.minimum_playtime, args.last_6_months_only)
+    if args.profile is not None:
+        profiling.PROFILER.configure([p for x in args.profile for p in x.split(',') if p], args.profile_mode, args.profile_dir)
 
-        if args.edit_games_like:
-            edit_fetch_games(args.edit_games_like, db)
-        else: #editing is mutually exclusive w/ fetch & publish
-            if args.fetch:
-                newsids = db.get_fetch_games()
-                get_all_recent_news(newsids, db, args.filter_feed_names)
-
-            if args.publish:
-                publish(db, args.publish)
+    run_start = time.perf_counter()
+    ok = False
+    try:
+        #opening creates the tables, or upgrades them if they're from an older version
+        with NewsDatabase(args.db_path) as db:
+            if args.snapshot_import:
+                from snapshot import import_snapshot
+                import_snapshot(db, args.snapshot_import)
+
+            if args.add_profile_games:
+                with profiling.phase('seed'):
+                    seed_database(args.add_profile_games, db, args.minimum_playtime, args.last_6_months_only, args.user)
+
+            if args.edit_games_like:
+                edit_fetch_games(args.edit_games_like, db, args.user)
+            else: #editing is mutually exclusive w/ fetch & publish
+                if args.fetch:
+                    newsids = db.get_fetch_games()
+                    with profiling.phase('fetch'):
+                        get_all_recent_news(newsids, db, args.filter_feed_names, not args.no_resume)
+
+                if args.prune_older_than is not None:
+                    db.prune_old_news(args.prune_older_than)
+
+                if args.update_clans:
+                    clanids = get_clan_ids_for_apps(db.get_fetch_games(), db)
+                    logger.info('%d of %d games have a clan id.', sum(1 for x in clanids.values() if x is not None), len(clanids))
+
+                if args.publish:
+                    from news_publisher import FeedLimits, publish
+                    with profiling.phase('publish'):
+                        publish(db, args.publish,
+                            [x for x in (args.feeds or '').split(',') if x],
+                            [x for x in (args.formats or '').split(',') if x],
+                            FeedLimits(args.max_feed_items, args.max_feed_bytes),
+                            args.compress,
+                            args.html_dir)
+
+            if args.snapshot_export:
+                from snapshot import export_snapshot
+                export_snapshot(db, args.snapshot_export)
+
+        if args.serve and not args.edit_games_like:
+            from feed_server import FeedServer
+            host, _, port = args.serve.rpartition(':')
+            server = FeedServer(args.db_path, args.publish or 'steam_news.xml',
+                [x for x in (args.feeds or '').split(',') if x],
+                [x for x in (args.formats or '').split(',') if x])
+            server.serve(host, int(port))
+        ok = True
+    finally:
+        profiling.PROFILER.finish()
+        if args.metrics_file:
+            metrics.RUN_SECONDS.set(time.perf_counter() - run_start)
+            metrics.RUN_TIMESTAMP.set(time.time())
+            metrics.RUN_SUCCESS.set(1 if ok else 0)
+            metrics.REGISTRY.write(args.metrics_file)
 
 if __name__ == '__main__':
     tap.Parser(Args).bind(main).run()
@@ -1,4 +1,5 @@
-from typing import TypedDict
+from enum import Enum
+from typing import NamedTuple, Optional, TypedDict
 
 class NewsItem(TypedDict):
     gid: str
@@ -25,3 +26,52 @@ class News(TypedDict):
 
 class NewsError(TypedDict):
     error: str
+
+class NewsRow(NamedTuple):
+    """A news item as we store and publish it; fields are in NewsItems column order.
+    New items get converted to these straight out of the JSON, and rows come back out of the DB as these."""
+    gid: str
+    title: str
+    url: Optional[str]
+    is_external_url: Optional[bool]
+    author: Optional[str]
+    contents: Optional[str]
+    feedlabel: Optional[str]
+    date: int
+    feedname: Optional[str]
+    feed_type: Optional[int] # 0=HTML, 1=BBCODE
+    appid: int
+
+    @classmethod
+    def from_json(cls, ned: NewsItem):
+        return cls(
+            ned['gid'], ned['title'], ned['url'], ned['is_external_url'], ned['author'], ned['contents'],
+            ned['feedlabel'], ned['date'], ned['feedname'], ned['feed_type'], ned['appid'],
+        )
+
+NEWS_ROW_COLUMNS = ', '.join(NewsRow._fields)
+
+class FetchedNews(NamedTuple):
+    """One GetNewsForApp result: the appid we asked for (which items get linked to), when it expires,
+    and its items as Steam sent them. They only get converted to NewsRows once we know they're new."""
+    appid: int
+    expires: int
+    items: list[NewsItem]
+
+# Steam's event_type numbers, grouped the way the store's news hub filters them
+class EventTypes(Enum):
+    news = [ 28 ]
+    events = [ 9, 27, 22, 23, 24, 35, 25, 26 ]
+    streaming = [ 11 ]
+    updates = [ 12, 13, 14 ]
+    releases = [ 10, 29, 16, 15, 32 ]
+    sales = [ 20, 21, 31, 34 ]
+
+    @staticmethod
+    def type_from_int(event_type: int):
+        if event_type in EventTypes.news.value: return EventTypes.news
+        if event_type in EventTypes.events.value: return EventTypes.events
+        if event_type in EventTypes.streaming.value: return EventTypes.streaming
+        if event_type in EventTypes.updates.value: return EventTypes.updates
+        if event_type in EventTypes.releases.value: return EventTypes.releases
+        if event_type in EventTypes.sales.value: return EventTypes.sales
@@ -1,11 +1,17 @@
+import asyncio
 from enum import Enum
 from itertools import groupby
-from typing import Any, Generator, Mapping, Protocol, Sequence, TypeVar, TypedDict
+import queue
+import threading
+from typing import Any, Generator, Iterator, Mapping, Protocol, Sequence, TypeVar, TypedDict
 from typing_extensions import ReadOnly
 from yarl import URL
 import requests
 from datetime import datetime, timezone
 
+import metrics
+from steam_news_types import EventTypes
+
 class URLs:
     API = URL("https://api.steampowered.com")
     COMMUNITY = URL("https://steamcommunity.com")
@@ -105,23 +111,6 @@ class AppType(Enum):
     Featured = "featured"
     Curator = "curator"
 
-class EventTypes(Enum):
-    news = [ 28 ]
-    events = [ 9, 27, 22, 23, 24, 35, 25, 26 ]
-    streaming = [ 11 ]
-    updates = [ 12, 13, 14 ]
-    releases = [ 10, 29, 16, 15, 32 ]
-    sales = [ 20, 21, 31, 34 ]
-
-    @staticmethod
-    def type_from_int(event_type: int):
-        if event_type in EventTypes.news.value: return EventTypes.news
-        if event_type in EventTypes.events.value: return EventTypes.events
-        if event_type in EventTypes.streaming.value: return EventTypes.streaming
-        if event_type in EventTypes.updates.value: return EventTypes.updates
-        if event_type in EventTypes.releases.value: return EventTypes.releases
-        if event_type in EventTypes.sales.value: return EventTypes.sales
-
 class UserEventCalendarRange(TypedDict):
     success: number
     backwardComplete: boolean | None
@@ -160,29 +149,102 @@ def chunks(lst: list[T], n: number):
     for i in range(0, len(lst), n):
         yield lst[i:i + n]
 
+def is_last_calendar_page(res: UserEventCalendarRange, count: int, limit: int | None):
+    """Whether paginating backwards should stop after this page, without asking for another."""
+    if res.get('backwardComplete') or res.get('forwardComplete'):
+        return True
+    if not res['documents']:
+        return True
+    return limit is not None and count >= limit
+
+def next_calendar_page_max_time(res: UserEventCalendarRange):
+    return datetime.fromtimestamp(min(x['start_time'] for x in res['documents']), timezone.utc)
+
+_DONE = object()
+
+def prefetch(source: Iterator[T], lookahead: int) -> Generator[T, None, None]:
+    """Run `source` on a background thread, buffering up to `lookahead` items ahead of the consumer.
+    Exceptions from the source are re-raised in the consumer."""
+    buffer: queue.Queue[Any] = queue.Queue(maxsize=max(lookahead, 1))
+    cancelled = threading.Event()
+
+    def put(item: Any):
+        # poll so that a cancelled consumer never leaves us blocked on a full queue
+        while not cancelled.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in source:
+                if not put(item):
+                    break
+        except BaseException as e:
+            put(e)
+        else:
+            put(_DONE)
+
+    thread = threading.Thread(target=produce, name='prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+
+def flatten_event_ids(clan_id_to_events_dict: dict[int, list[int]] | list[tuple[int, list[int]]]):
+    return [
+        (clan_id, unique_id)
+            for clan_id, events in (clan_id_to_events_dict.items() if isinstance(clan_id_to_events_dict, dict) else clan_id_to_events_dict)
+            for unique_id in events
+    ]
+
+class NotSuccessError(ValueError):
+    """Steam answered, but with success != 1 (e.g. an app with no clan)"""
+
+def clean_params(params: Mapping[str, str | bytes | None] | None):
+    return {k: v for k, v in params.items() if v is not None and len(v) > 0} if params else None
+
 class SteamUnofficialApi:
-    def __init__(self, headers: Mapping[str, str | bytes | None] = {}):
+    def __init__(self, headers: Mapping[str, str | bytes | None] = {}, timeout: float | None = 30):
         self.headers = headers
+        self.timeout = timeout
+        self.session = requests.Session()
 
     def get(self, url: URL | str, params: Mapping[str, str | bytes | None] | None = None):
-        response = requests.get(
-            str(url) if isinstance(url, URL) else url,
-            {k: v for k, v in params.items() if v is not None and len(v) > 0} if params else None,
-            headers=self.headers
-        )
-        response.raise_for_status()
+        url = str(url) if isinstance(url, URL) else url
+        #the last path segment names the endpoint; earlier ones can be ids
+        endpoint = url.rstrip('/').rsplit('/', 1)[-1]
+        try:
+            with metrics.HTTP_REQUEST_SECONDS.time(endpoint=endpoint):
+                response = self.session.get(
+                    url,
+                    params=clean_params(params),
+                    headers=self.headers,
+                    timeout=self.timeout,
+                )
+            metrics.HTTP_RESPONSE_BYTES.inc(len(response.content), endpoint=endpoint)
+            response.raise_for_status()
+        except requests.RequestException:
+            metrics.HTTP_ERRORS.inc(endpoint=endpoint)
+            raise
         return response.json()
 
     def check_success(self, data: HasSuccess):
         if data['success'] != 1:
-            raise ValueError(f'Not success: {data["success"]}')
+            raise NotSuccessError(f'Not success: {data["success"]}')
 
     def get_event_details(self, clan_id_to_events_dict: dict[int, list[int]] | list[tuple[int, list[int]]], lang_list: list[int] = [0]):
-        ls = [
-            (clan_id, unique_id)
-                for clan_id, events in (clan_id_to_events_dict.items() if isinstance(clan_id_to_events_dict, dict) else clan_id_to_events_dict)
-                for unique_id in events
-        ]
+        ls = flatten_event_ids(clan_id_to_events_dict)
 
         params = {
             "clanid_list": ",".join(str(x[0]) for x in ls),
@@ -274,15 +336,99 @@ class SteamUnofficialApi:
 
             count += len(res['documents'])
 
-            maxTime = datetime.fromtimestamp(min(x['start_time'] for x in res['documents']), timezone.utc)
-
             yield res
 
-            if ('backwardComplete' in res and res['backwardComplete']) or ('forwardComplete' in res and res['forwardComplete']):
+            if is_last_calendar_page(res, count, limit):
                 break
 
-            if limit is not None and count >= limit:
-                break
+            maxTime = next_calendar_page_max_time(res)
+
+    def prefetch_user_event_calendar_range_backwards(
+        self,
+        appTypes: list[AppType] = [],
+        eventTypes: list[EventTypes] = [],
+        collectionID: int | None = None,
+        saleID: int | None = None,
+        hubtype: Any | None = None,
+        category_or_language: Any | None = None,
+        tag_name: Any | None = None,
+        tags: list[Any] = [],
+        appIdFilter: list[int] = [],
+        clanIdFilter: list[int] = [],
+        limit: int | None = None,
+        lookahead: int = 2,
+    ):
+        """Same as paginate_user_event_calendar_range_backwards, but pages are fetched
+        on a background thread up to `lookahead` pages ahead of the consumer.
+        Closing the generator (or breaking out of the loop) stops the fetcher."""
+        pages = self.paginate_user_event_calendar_range_backwards(
+            appTypes=appTypes,
+            eventTypes=eventTypes,
+            collectionID=collectionID,
+            saleID=saleID,
+            hubtype=hubtype,
+            category_or_language=category_or_language,
+            tag_name=tag_name,
+            tags=tags,
+            appIdFilter=appIdFilter,
+            clanIdFilter=clanIdFilter,
+            limit=limit,
+        )
+        return prefetch(pages, lookahead)
+
+    async def apaginate_user_event_calendar_range_backwards(
+        self,
+        appTypes: list[AppType] = [],
+        eventTypes: list[EventTypes] = [],
+        collectionID: int | None = None,
+        saleID: int | None = None,
+        hubtype: Any | None = None,
+        category_or_language: Any | None = None,
+        tag_name: Any | None = None,
+        tags: list[Any] = [],
+        appIdFilter: list[int] = [],
+        clanIdFilter: list[int] = [],
+        limit: int | None = None,
+        lookahead: int = 2,
+    ):
+        """Async iterator form of prefetch_user_event_calendar_range_backwards."""
+        pages = self.paginate_user_event_calendar_range_backwards(
+            appTypes=appTypes,
+            eventTypes=eventTypes,
+            collectionID=collectionID,
+            saleID=saleID,
+            hubtype=hubtype,
+            category_or_language=category_or_language,
+            tag_name=tag_name,
+            tags=tags,
+            appIdFilter=appIdFilter,
+            clanIdFilter=clanIdFilter,
+            limit=limit,
+        )
+        buffer: asyncio.Queue[Any] = asyncio.Queue(maxsize=max(lookahead, 1))
+
+        async def produce():
+            try:
+                # each page needs the previous one's oldest start_time, so fetching stays serial;
+                # the overlap is with whatever the consumer does between pages
+                while (res := await asyncio.to_thread(next, pages, None)) is not None:
+                    await buffer.put(res)
+            except Exception as e:
+                await buffer.put(e)
+            else:
+                await buffer.put(_DONE)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await buffer.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()
 
     def resolve_events(self, data: UserEventCalendarRange):
         events_dict = dict((e['gid'], e) for e in data['events'])
@@ -314,3 +460,135 @@ class SteamUnofficialApi:
 
         for doc in data['documents']: # return in original order
             yield events_dict[doc['unique_id']]
+
+
+class AsyncSteamUnofficialApi:
+    """asyncio counterpart of SteamUnofficialApi.
+
+    Requests run on worker threads through one shared session, at most `max_concurrency` at a time.
+    Identical GETs that are already in flight are shared rather than repeated, and
+    get_event_details calls made within `batch_window` seconds of each other are merged
+    into requests of up to `max_batch_size` events."""
+
+    def __init__(
+        self,
+        headers: Mapping[str, str | bytes | None] = {},
+        timeout: float | None = 30,
+        max_concurrency: int = 8,
+        max_batch_size: int = 20,
+        batch_window: float = 0.01,
+    ):
+        self.sync = SteamUnofficialApi(headers, timeout)
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._in_flight: dict[tuple[str, tuple[tuple[str, Any], ...]], asyncio.Future[Any]] = {}
+        # keyed on lang_list, since that is shared by the whole request
+        self._event_futures: dict[tuple[tuple[int, ...], int, int], asyncio.Future[ClanEvent | None]] = {}
+        self._event_batches: dict[tuple[int, ...], list[tuple[int, int]]] = {}
+        self._event_timers: dict[tuple[int, ...], asyncio.TimerHandle] = {}
+        self._tasks = set[asyncio.Task[None]]()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    async def close(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.sync.session.close()
+
+    async def _run(self, fn, *args, **kwargs):
+        async with self._limit:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def get(self, url: URL | str, params: Mapping[str, str | bytes | None] | None = None):
+        key = (str(url), tuple(sorted((clean_params(params) or {}).items())))
+        if (fut := self._in_flight.get(key)) is None:
+            fut = asyncio.ensure_future(self._run(self.sync.get, url, params))
+            self._in_flight[key] = fut
+            fut.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shield so one cancelled caller doesn't cancel the request for everyone else sharing it
+        return await asyncio.shield(fut)
+
+    def check_success(self, data: HasSuccess):
+        self.sync.check_success(data)
+
+    async def get_event_details(self, clan_id_to_events_dict: dict[int, list[int]] | list[tuple[int, list[int]]], lang_list: list[int] = [0]):
+        langs = tuple(lang_list)
+        futures = [self._queue_event(langs, clan_id, unique_id) for clan_id, unique_id in flatten_event_ids(clan_id_to_events_dict)]
+        events = await asyncio.gather(*(asyncio.shield(f) for f in futures))
+        return [e for e in events if e is not None]
+
+    def _queue_event(self, langs: tuple[int, ...], clan_id: int, unique_id: int):
+        key = (langs, int(clan_id), int(unique_id))
+        if (fut := self._event_futures.get(key)) is not None:
+            return fut # already queued or in flight
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._event_futures[key] = fut
+        batch = self._event_batches.setdefault(langs, [])
+        batch.append((key[1], key[2]))
+        if len(batch) >= self.max_batch_size:
+            self._flush_events(langs)
+        elif langs not in self._event_timers:
+            self._event_timers[langs] = loop.call_later(self.batch_window, self._flush_events, langs)
+        return fut
+
+    def _flush_events(self, langs: tuple[int, ...]):
+        if (timer := self._event_timers.pop(langs, None)) is not None:
+            timer.cancel()
+        batch = self._event_batches.pop(langs, None)
+        if batch:
+            task = asyncio.create_task(self._fetch_events(langs, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fetch_events(self, langs: tuple[int, ...], batch: list[tuple[int, int]]):
+        keys = [(langs, clan_id, unique_id) for clan_id, unique_id in batch]
+        try:
+            events = await self._run(self.sync.get_event_details, [(clan_id, [unique_id]) for clan_id, unique_id in batch], list(langs))
+            by_gid = {e['gid']: e for e in events}
+            for key in keys:
+                if not (fut := self._event_futures[key]).done():
+                    fut.set_result(by_gid.get(str(key[2])))
+        except Exception as e:
+            for key in keys:
+                if not (fut := self._event_futures[key]).done():
+                    fut.set_exception(e)
+        finally:
+            for key in keys:
+                self._event_futures.pop(key, None)
+
+    async def get_vanity_and_clan_id(self, appid: int):
+        data: VanityAndClanId = await self.get(URLs.COMMUNITY / 'ogg' / str(appid) / 'ajaxgetvanityandclanid/')
+        self.check_success(data)
+        return data
+
+    async def get_user_event_calendar_range(self, **kwargs: Any) -> UserEventCalendarRange:
+        """Takes the same keyword arguments as SteamUnofficialApi.get_user_event_calendar_range."""
+        return await self._run(self.sync.get_user_event_calendar_range, **kwargs)
+
+    async def paginate_user_event_calendar_range_backwards(self, limit: int | None = None, **kwargs: Any):
+        """Takes the same keyword arguments as SteamUnofficialApi.paginate_user_event_calendar_range_backwards."""
+        async for res in self.sync.apaginate_user_event_calendar_range_backwards(limit=limit, **kwargs):
+            yield res
+
+    async def resolve_events(self, data: UserEventCalendarRange):
+        events_dict = dict((e['gid'], e) for e in data['events'])
+
+        unmapped = [doc for doc in data['documents'] if doc['unique_id'] not in events_dict]
+        # one call per clan; concurrent calls get coalesced into batched requests anyway
+        resolved = await asyncio.gather(*(
+            self.get_event_details([(int(k), [int(x['unique_id']) for x in v])])
+                for k, v in groupby(unmapped, lambda x: x['clanid'])
+        ))
+        for events in resolved:
+            for event in events:
+                events_dict[event['gid']] = event
+
+        return [events_dict[doc['unique_id']] for doc in data['documents'] if doc['unique_id'] in events_dict]